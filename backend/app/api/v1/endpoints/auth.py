@@ -3,9 +3,11 @@ Authentication endpoints
 Handles Email OTP-based signup and login
 """
 
-from fastapi import APIRouter, HTTPException, status, Request
+from fastapi import APIRouter, HTTPException, status, Request, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime, timedelta, date
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from app.models import (
     OTPRequest,
@@ -21,7 +23,6 @@ from app.core import (
     get_database,
     generate_otp,
     hash_otp,
-    verify_otp,
     create_access_token,
     decode_access_token,
     settings,
@@ -31,14 +32,63 @@ from app.core import (
 from app.core.rate_limit import limiter
 from app.utils.sanitization import sanitize_text, sanitize_username
 from app.services.email_otp_service import send_otp_email
+from app.services.otp_session_service import (
+    otp_session_store,
+    VERIFY_NOT_FOUND,
+    VERIFY_MAX_ATTEMPTS,
+    VERIFY_INVALID,
+    VERIFY_ALREADY_VERIFIED
+)
 from app.models.user import User, UserProfile, UserEncryption, UserPrivacy, Gender
 
 router = APIRouter()
 
+# Time allowed to complete the profile after OTP verification
+TEMP_TOKEN_EXPIRY_MINUTES = 15
+
+# Fields read when building UserDetailResponse
+USER_DETAIL_PROJECTION = {
+    "email": 1,
+    "username": 1,
+    "profile": 1,
+    "privacy": 1,
+    "devices": 1,
+    "status": 1
+}
+
+
+async def start_otp_session(request: Request, data: OTPRequest, background_tasks: BackgroundTasks) -> str:
+    """
+    Generate an OTP, store its session and schedule the email
+    
+    Args:
+        request: Incoming request (for client IP / user agent)
+        data: OTP request (email + purpose)
+        background_tasks: Response background tasks
+        
+    Returns:
+        OTP session ID
+    """
+    otp = generate_otp(settings.OTP_LENGTH)
+    
+    session_id = await otp_session_store.create(
+        identifier=data.email.lower(),
+        otp_hash=hash_otp(otp),
+        purpose=data.purpose,
+        ttl_seconds=settings.OTP_EXPIRY_MINUTES * 60,
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent")
+    )
+    
+    # Send OTP via Email after the response is returned
+    background_tasks.add_task(send_otp_email, data.email, otp, data.purpose)
+    
+    return session_id
+
 
 @router.post("/signup", response_model=OTPResponse, status_code=status.HTTP_200_OK)
 @limiter.limit("5/hour")
-async def signup(request: Request, data: OTPRequest):
+async def signup(request: Request, data: OTPRequest, background_tasks: BackgroundTasks):
     """
     Step 1: Initiate signup process by sending OTP to email
     
@@ -51,50 +101,17 @@ async def signup(request: Request, data: OTPRequest):
     db = await get_database()
     
     # Check if user already exists
-    existing_user = await db.users.find_one({"email": data.email.lower()})
+    existing_user = await db.users.find_one({"email": data.email.lower()}, {"_id": 1})
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Email already registered. Please login instead."
         )
     
-    # Generate OTP
-    otp = generate_otp(settings.OTP_LENGTH)
-    otp_hashed = hash_otp(otp)
-    
-    # Send OTP via Email
-    try:
-        await send_otp_email(data.email, otp, data.purpose)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send OTP email: {str(e)}"
-        )
-    
-    # Create OTP session
-    expires_at = datetime.utcnow() + timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
-    
-    otp_session = {
-        "identifier": data.email.lower(),
-        "otp_hash": otp_hashed,
-        "attempts": 0,
-        "max_attempts": 3,
-        "created_at": datetime.utcnow(),
-        "expires_at": expires_at,
-        "verified": False,
-        "verified_at": None,
-        "session_token": None,
-        "metadata": {
-            "ip_address": request.client.host if request.client else None,
-            "user_agent": request.headers.get("user-agent"),
-            "purpose": data.purpose
-        }
-    }
-    
-    result = await db.otp_sessions.insert_one(otp_session)
+    session_id = await start_otp_session(request, data, background_tasks)
     
     return OTPResponse(
-        session_id=str(result.inserted_id),
+        session_id=session_id,
         expires_in=settings.OTP_EXPIRY_MINUTES * 60,
         message=f"OTP sent successfully to {data.email}"
     )
@@ -102,7 +119,7 @@ async def signup(request: Request, data: OTPRequest):
 
 @router.post("/login", response_model=OTPResponse, status_code=status.HTTP_200_OK)
 @limiter.limit("5/hour")
-async def login(request: Request, data: OTPRequest):
+async def login(request: Request, data: OTPRequest, background_tasks: BackgroundTasks):
     """
     Initiate login process by sending OTP to email
     
@@ -114,50 +131,17 @@ async def login(request: Request, data: OTPRequest):
     db = await get_database()
     
     # Check if user exists
-    user = await db.users.find_one({"email": data.email.lower()})
+    user = await db.users.find_one({"email": data.email.lower()}, {"_id": 1})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Email not registered. Please signup first."
         )
     
-    # Generate OTP
-    otp = generate_otp(settings.OTP_LENGTH)
-    otp_hashed = hash_otp(otp)
-    
-    # Send OTP via Email
-    try:
-        await send_otp_email(data.email, otp, data.purpose)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send OTP email: {str(e)}"
-        )
-    
-    # Create OTP session
-    expires_at = datetime.utcnow() + timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
-    
-    otp_session = {
-        "identifier": data.email.lower(),
-        "otp_hash": otp_hashed,
-        "attempts": 0,
-        "max_attempts": 3,
-        "created_at": datetime.utcnow(),
-        "expires_at": expires_at,
-        "verified": False,
-        "verified_at": None,
-        "session_token": None,
-        "metadata": {
-            "ip_address": request.client.host if request.client else None,
-            "user_agent": request.headers.get("user-agent"),
-            "purpose": data.purpose
-        }
-    }
-    
-    result = await db.otp_sessions.insert_one(otp_session)
+    session_id = await start_otp_session(request, data, background_tasks)
     
     return OTPResponse(
-        session_id=str(result.inserted_id),
+        session_id=session_id,
         expires_in=settings.OTP_EXPIRY_MINUTES * 60,
         message=f"OTP sent successfully to {data.email}"
     )
@@ -203,7 +187,8 @@ async def login_password(request: Request, data: PasswordLoginRequest):
             detail="Password login not set up for this account. Please use OTP login."
         )
 
-    if not verify_password(data.password, user["hashed_password"]):
+    # bcrypt is CPU-bound; keep it off the event loop
+    if not await run_in_threadpool(verify_password, data.password, user["hashed_password"]):
          raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
@@ -241,7 +226,7 @@ async def login_password(request: Request, data: PasswordLoginRequest):
 
 @router.post("/resend-otp", response_model=OTPResponse, status_code=status.HTTP_200_OK)
 @limiter.limit("3/hour")
-async def resend_otp(request: Request, data: OTPRequest):
+async def resend_otp(request: Request, data: OTPRequest, background_tasks: BackgroundTasks):
     """
     Resend OTP to email
     
@@ -250,56 +235,13 @@ async def resend_otp(request: Request, data: OTPRequest):
     - Sends to email
     - Rate limited to 3 attempts per hour
     """
-    db = await get_database()
-    
-    # Invalidate any existing unverified sessions for this email
-    await db.otp_sessions.update_many(
-        {
-            "identifier": data.email.lower(),
-            "verified": False
-        },
-        {
-            "$set": {"expires_at": datetime.utcnow()}  # Expire immediately
-        }
-    )
-    
-    # Generate new OTP
-    otp = generate_otp(settings.OTP_LENGTH)
-    otp_hashed = hash_otp(otp)
-    
-    # Send OTP via Email
-    try:
-        await send_otp_email(data.email, otp, data.purpose)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send OTP email: {str(e)}"
-        )
-    
-    # Create new OTP session
-    expires_at = datetime.utcnow() + timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
-    
-    otp_session = {
-        "identifier": data.email.lower(),
-        "otp_hash": otp_hashed,
-        "attempts": 0,
-        "max_attempts": 3,
-        "created_at": datetime.utcnow(),
-        "expires_at": expires_at,
-        "verified": False,
-        "verified_at": None,
-        "session_token": None,
-        "metadata": {
-            "ip_address": request.client.host if request.client else None,
-            "user_agent": request.headers.get("user-agent"),
-            "purpose": data.purpose
-        }
-    }
+    # Invalidate any existing unverified session for this email
+    await otp_session_store.invalidate_pending(data.email.lower())
     
-    result = await db.otp_sessions.insert_one(otp_session)
+    session_id = await start_otp_session(request, data, background_tasks)
     
     return OTPResponse(
-        session_id=str(result.inserted_id),
+        session_id=session_id,
         expires_in=settings.OTP_EXPIRY_MINUTES * 60,
         message=f"OTP resent successfully to {data.email}"
     )
@@ -316,82 +258,47 @@ async def verify_otp_endpoint(request: Request, data: OTPVerifyRequest):
     - Returns temp token for signup completion
     - Rate limited to 10 attempts per minute (to prevent brute force)
     """
-    db = await get_database()
-    
-    # Get OTP session
-    try:
-        session_id = ObjectId(data.session_id)
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid session ID"
-        )
-    
-    otp_session = await db.otp_sessions.find_one({"_id": session_id})
+    # Check and consume the attempt (single Redis round-trip)
+    result = await otp_session_store.verify(
+        data.session_id,
+        hash_otp(data.otp),
+        verified_ttl_seconds=TEMP_TOKEN_EXPIRY_MINUTES * 60
+    )
+    outcome = result[0]
     
-    if not otp_session:
+    if outcome == VERIFY_NOT_FOUND:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="OTP session not found"
-        )
-    
-    # Check if session expired
-    if datetime.utcnow() > otp_session["expires_at"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="OTP expired. Please request a new one."
+            detail="OTP session not found or expired. Please request a new one."
         )
     
-    # Check if already verified
-    if otp_session["verified"]:
+    if outcome == VERIFY_ALREADY_VERIFIED:
         # Return existing temp token if still valid
         return OTPVerifyResponse(
             verified=True,
-            temp_token=otp_session.get("session_token"),
+            temp_token=result[1] or None,
             message="OTP already verified. Please complete your profile."
         )
     
-    # Check attempts
-    if otp_session["attempts"] >= otp_session["max_attempts"]:
+    if outcome == VERIFY_MAX_ATTEMPTS:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Maximum OTP attempts exceeded. Please request a new OTP."
         )
     
-    # Verify OTP
-    if not verify_otp(data.otp, otp_session["otp_hash"]):
-        # Increment attempts
-        await db.otp_sessions.update_one(
-            {"_id": session_id},
-            {"$inc": {"attempts": 1}}
-        )
-        
-        remaining_attempts = otp_session["max_attempts"] - (otp_session["attempts"] + 1)
+    if outcome == VERIFY_INVALID:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid OTP. {remaining_attempts} attempts remaining."
+            detail=f"Invalid OTP. {result[1]} attempts remaining."
         )
     
-    # Mark as verified and create temp token
+    # Temp token for completing signup, signed only once the OTP checked out; the
+    # verified identity is read back from the session, so the token only references it
     temp_token = create_access_token(
-        data={
-            "session_id": str(session_id),
-            "identifier": otp_session["identifier"],
-            "purpose": otp_session["metadata"]["purpose"]
-        },
-        expires_delta=timedelta(minutes=15)  # 15 minutes to complete profile
-    )
-    
-    await db.otp_sessions.update_one(
-        {"_id": session_id},
-        {
-            "$set": {
-                "verified": True,
-                "verified_at": datetime.utcnow(),
-                "session_token": temp_token
-            }
-        }
+        data={"session_id": data.session_id},
+        expires_delta=timedelta(minutes=TEMP_TOKEN_EXPIRY_MINUTES)
     )
+    await otp_session_store.store_session_token(data.session_id, temp_token)
     
     return OTPVerifyResponse(
         verified=True,
@@ -427,19 +334,10 @@ async def complete_signup(user_data: UserCreate, temp_token: str):
         )
     
     session_id = payload.get("session_id")
-    identifier = payload.get("identifier")
-    purpose = payload.get("purpose")
     
     # Verify OTP session
-    try:
-        otp_session = await db.otp_sessions.find_one({"_id": ObjectId(session_id)})
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid session"
-        )
-    
-    if not otp_session or not otp_session["verified"]:
+    identifier = await otp_session_store.get_verified_identifier(session_id) if session_id else None
+    if not identifier:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="OTP not verified"
@@ -452,22 +350,25 @@ async def complete_signup(user_data: UserCreate, temp_token: str):
             detail="Email mismatch. Please use the email you verified."
         )
     
-    # Check if username already taken
-    existing_username = await db.users.find_one({"username": user_data.username})
-    if existing_username:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Username already taken. Please choose a different username."
-        )
-    
-    # Check if mobile number already taken
-    existing_mobile = await db.users.find_one({"profile.mobile": user_data.mobile})
-    if existing_mobile:
+    # Check if username or mobile number already taken (one round-trip)
+    clash = await db.users.find_one(
+        {"$or": [{"username": user_data.username}, {"profile.mobile": user_data.mobile}]},
+        {"username": 1}
+    )
+    if clash:
+        if clash.get("username") == user_data.username:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Username already taken. Please choose a different username."
+            )
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Mobile number already registered."
         )
     
+    # bcrypt is CPU-bound; keep it off the event loop
+    hashed_password = await run_in_threadpool(hash_password, user_data.password)
+    
     # Create user with complete profile
     user = User(
         email=user_data.email.lower(),
@@ -483,7 +384,7 @@ async def complete_signup(user_data: UserCreate, temp_token: str):
         privacy=UserPrivacy(),
         encryption=UserEncryption(public_key=user_data.public_key),
         devices=[user_data.device_info],
-        hashed_password=hash_password(user_data.password)
+        hashed_password=hashed_password
     )
     
     user_dict = user.model_dump(by_alias=True, exclude={"id"})
@@ -494,7 +395,21 @@ async def complete_signup(user_data: UserCreate, temp_token: str):
         if isinstance(dob, date) and not isinstance(dob, datetime):
             user_dict["profile"]["date_of_birth"] = datetime.combine(dob, datetime.min.time())
             
-    result = await db.users.insert_one(user_dict)
+    # Unique indexes are the race-free guard if a concurrent signup slipped past the check
+    try:
+        result = await db.users.insert_one(user_dict)
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        if "username" in key_pattern:
+            detail = "Username already taken. Please choose a different username."
+        elif "profile.mobile" in key_pattern:
+            detail = "Mobile number already registered."
+        else:
+            detail = "Email already registered. Please login instead."
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=detail
+        )
     
     # Create session token
     session_token = create_access_token(
@@ -505,18 +420,16 @@ async def complete_signup(user_data: UserCreate, temp_token: str):
         }
     )
     
-    # Get created user
-    created_user = await db.users.find_one({"_id": result.inserted_id})
-    
+    # Build the response from the document we just inserted (no re-read)
     return AuthResponse(
         user=UserDetailResponse(
-            id=str(created_user["_id"]),
-            email=created_user["email"],
-            username=created_user["username"],
-            profile=UserProfile(**created_user["profile"]),
-            privacy=UserPrivacy(**created_user["privacy"]),
-            devices=created_user["devices"],
-            status=created_user["status"]
+            id=str(result.inserted_id),
+            email=user.email,
+            username=user.username,
+            profile=user.profile,
+            privacy=user.privacy,
+            devices=user.devices,
+            status=user.status
         ),
         access_token=session_token,
         token_type="bearer"
@@ -545,7 +458,7 @@ async def get_current_user(token: str):
     
     # Get user
     try:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, USER_DETAIL_PROJECTION)
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
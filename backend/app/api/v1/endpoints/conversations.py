@@ -2,11 +2,14 @@
 Conversation endpoints
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 from typing import Optional
+from pydantic import TypeAdapter
 
+from app.models.user import ObjectIdStr
 from app.models.conversation import (
     ConversationCreate,
     ConversationResponse,
@@ -14,29 +17,17 @@ from app.models.conversation import (
     ConversationParticipant,
     ConversationMetadata
 )
-from app.core import get_database, decode_access_token
+from app.core import get_database
+from app.api.deps import get_current_user_id
+from app.services.user_cache_service import get_user_cards
+from app.utils.responses import json_response
 
 router = APIRouter()
 
-
-async def get_current_user_id(authorization: str = Header(...)) -> str:
-    """Dependency to get current user ID from token"""
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authorization header"
-        )
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
-    
-    return payload.get("user_id")
+# Response models are built once in the handler and serialized straight to
+# JSON bytes, skipping FastAPI's re-validation against response_model
+_conversation_adapter = TypeAdapter(ConversationResponse)
+_conversation_list_adapter = TypeAdapter(ConversationListResponse)
 
 
 @router.post("", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
@@ -53,57 +44,58 @@ async def create_or_get_conversation(
     db = await get_database()
     
     # Validate participant exists
-    participant = await db.users.find_one({"_id": ObjectId(data.participant_id)})
+    participant = await db.users.find_one({"_id": ObjectId(data.participant_id)}, {"_id": 1})
     if not participant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Check if conversation already exists (one-to-one)
     participant_ids_sorted = sorted([current_user_id, data.participant_id])
     
-    existing_conversation = await db.conversations.find_one({
-        "type": "one_to_one",
-        "participant_ids": participant_ids_sorted
-    })
-    
-    if existing_conversation:
-        # Return existing conversation
-        return await format_conversation_response(existing_conversation, current_user_id, db)
-    
-    # Create new conversation
-    conversation = {
-        "type": "one_to_one",
-        "participants": [
-            {
-                "user_id": current_user_id,
-                "joined_at": datetime.utcnow(),
-                "left_at": None,
-                "last_read_at": None,
-                "notifications_enabled": True
-            },
-            {
-                "user_id": data.participant_id,
-                "joined_at": datetime.utcnow(),
-                "left_at": None,
-                "last_read_at": None,
-                "notifications_enabled": True
+    # Get existing one-to-one conversation or create it in a single round-trip.
+    # pair_key is unique, so concurrent creates for the same pair can't duplicate it.
+    now = datetime.utcnow()
+    conversation = await db.conversations.find_one_and_update(
+        {"pair_key": ":".join(participant_ids_sorted)},
+        {
+            "$setOnInsert": {
+                "type": "one_to_one",
+                "participant_ids": participant_ids_sorted,
+                "participants": [
+                    {
+                        "user_id": current_user_id,
+                        "joined_at": now,
+                        "left_at": None,
+                        "last_read_at": None,
+                        "unread_count": 0,
+                        "has_deletions": False,
+                        "notifications_enabled": True
+                    },
+                    {
+                        "user_id": data.participant_id,
+                        "joined_at": now,
+                        "left_at": None,
+                        "last_read_at": None,
+                        "unread_count": 0,
+                        "has_deletions": False,
+                        "notifications_enabled": True
+                    }
+                ],
+                "last_message": None,
+                "metadata": {
+                    "created_at": now,
+                    "updated_at": now,
+                    "archived_by": []
+                }
             }
-        ],
-        "participant_ids": participant_ids_sorted,
-        "last_message": None,
-        "metadata": {
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "archived_by": []
-        }
-    }
-    
-    result = await db.conversations.insert_one(conversation)
-    conversation["_id"] = result.inserted_id
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
     
-    return await format_conversation_response(conversation, current_user_id, db)
+    formatted = (await build_conversation_responses([conversation], current_user_id, db))[0]
+    return json_response(_conversation_adapter, formatted, status.HTTP_201_CREATED)
 
 
 @router.get("", response_model=ConversationListResponse)
@@ -120,45 +112,47 @@ async def get_conversations(
     """
     db = await get_database()
     
-    # Find conversations where user is a participant
-    conversations = await db.conversations.find({
-        "participant_ids": current_user_id,
-        "metadata.archived_by": {"$ne": current_user_id}  # Exclude archived
-    }).sort("metadata.updated_at", -1).skip(skip).limit(limit).to_list(length=limit)
+    # Page and total count in a single aggregation (one round-trip, one index scan).
+    # Sort before $facet: stages inside $facet cannot use indexes.
+    pipeline = [
+        {"$match": {
+            "participant_ids": current_user_id,
+            "metadata.archived_by": {"$ne": current_user_id}  # Exclude archived
+        }},
+        {"$sort": {"metadata.updated_at": -1}},
+        {"$facet": {
+            "page": [
+                {"$skip": skip},
+                {"$limit": limit}
+            ],
+            "total": [{"$count": "n"}]
+        }}
+    ]
+    result = await db.conversations.aggregate(pipeline).to_list(length=1)
+    conversations = result[0]["page"]
+    total = result[0]["total"][0]["n"] if result[0]["total"] else 0
     
-    # Get total count
-    total = await db.conversations.count_documents({
-        "participant_ids": current_user_id,
-        "metadata.archived_by": {"$ne": current_user_id}
-    })
+    # Format responses (participants and unread counts are fetched in batch)
+    formatted_conversations = await build_conversation_responses(conversations, current_user_id, db)
     
-    # Format responses
-    formatted_conversations = []
-    for conv in conversations:
-        formatted = await format_conversation_response(conv, current_user_id, db)
-        formatted_conversations.append(formatted)
-    
-    return ConversationListResponse(
-        conversations=formatted_conversations,
-        total=total
+    return json_response(
+        _conversation_list_adapter,
+        ConversationListResponse.model_construct(
+            conversations=formatted_conversations,
+            total=total
+        )
     )
 
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
-    conversation_id: str,
+    conversation_id: ObjectIdStr,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """Get a specific conversation"""
     db = await get_database()
     
-    try:
-        conversation = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid conversation ID"
-        )
+    conversation = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
     
     if not conversation:
         raise HTTPException(
@@ -173,12 +167,13 @@ async def get_conversation(
             detail="Not a participant in this conversation"
         )
     
-    return await format_conversation_response(conversation, current_user_id, db)
+    formatted = (await build_conversation_responses([conversation], current_user_id, db))[0]
+    return json_response(_conversation_adapter, formatted)
 
 
 @router.delete("/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_conversation(
-    conversation_id: str,
+    conversation_id: ObjectIdStr,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """
@@ -189,21 +184,15 @@ async def delete_conversation(
     """
     db = await get_database()
     
-    try:
-        result = await db.conversations.update_one(
-            {
-                "_id": ObjectId(conversation_id),
-                "participant_ids": current_user_id
-            },
-            {
-                "$addToSet": {"metadata.archived_by": current_user_id}
-            }
-        )
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid conversation ID"
-        )
+    result = await db.conversations.update_one(
+        {
+            "_id": ObjectId(conversation_id),
+            "participant_ids": current_user_id
+        },
+        {
+            "$addToSet": {"metadata.archived_by": current_user_id}
+        }
+    )
     
     if result.matched_count == 0:
         raise HTTPException(
@@ -214,45 +203,61 @@ async def delete_conversation(
     return None
 
 
-async def format_conversation_response(conversation: dict, current_user_id: str, db) -> ConversationResponse:
-    """Format conversation for response"""
+def _get_current_participant(conversation: dict, current_user_id: str) -> Optional[dict]:
+    """Return the current user's participant entry in a conversation"""
+    return next(
+        (p for p in conversation["participants"] if p["user_id"] == current_user_id),
+        None
+    )
+
+
+async def fetch_participant_users(conversations: list, current_user_id: str, db) -> dict:
+    """
+    Fetch the other participants of all given conversations (Redis-cached)
+    
+    Returns:
+        Mapping of user ID string -> participant card
+    """
+    other_ids = {
+        p["user_id"]
+        for conversation in conversations
+        for p in conversation["participants"]
+        if p["user_id"] != current_user_id
+    }
+    
+    return await get_user_cards(other_ids, db)
+
+
+async def build_conversation_responses(conversations: list, current_user_id: str, db) -> list:
+    """Format a batch of conversations with one participant lookup regardless of batch size"""
+    users_map = await fetch_participant_users(conversations, current_user_id, db)
+    
+    return [
+        format_conversation_response(conversation, current_user_id, users_map)
+        for conversation in conversations
+    ]
+
+
+def format_conversation_response(
+    conversation: dict,
+    current_user_id: str,
+    users_map: dict
+) -> ConversationResponse:
+    """Format conversation for response (trusted document, built without validation)"""
     
     # Get participant details
     participant_details = []
     for participant in conversation["participants"]:
         if participant["user_id"] != current_user_id:
-            user = await db.users.find_one({"_id": ObjectId(participant["user_id"])})
-            if user:
-                participant_details.append({
-                    "user_id": str(user["_id"]),
-                    "username": user["username"],
-                    "full_name": user["profile"]["full_name"],
-                    "avatar_url": user["profile"].get("avatar_url"),
-                    "online": user["status"].get("online", False),
-                    "last_seen": user["status"].get("last_seen"),
-                    "public_key": user.get("encryption", {}).get("public_key")
-                })
-    
-    # Calculate unread count
-    current_participant = next(
-        (p for p in conversation["participants"] if p["user_id"] == current_user_id),
-        None
-    )
+            card = users_map.get(participant["user_id"])
+            if card:
+                participant_details.append(card)
     
-    unread_count = 0
-    if current_participant and conversation.get("last_message"):
-        last_read_at = current_participant.get("last_read_at")
-        last_message_time = conversation["last_message"]["timestamp"]
-        
-        if not last_read_at or last_message_time > last_read_at:
-            # Count unread messages
-            unread_count = await db.messages.count_documents({
-                "conversation_id": str(conversation["_id"]),
-                "sender_id": {"$ne": current_user_id},
-                "created_at": {"$gt": last_read_at} if last_read_at else {"$exists": True}
-            })
+    # Unread count is maintained on the participant entry by send/read
+    current_participant = _get_current_participant(conversation, current_user_id)
+    unread_count = current_participant.get("unread_count", 0) if current_participant else 0
     
-    return ConversationResponse(
+    return ConversationResponse.model_construct(
         id=str(conversation["_id"]),
         type=conversation["type"],
         participants=participant_details,
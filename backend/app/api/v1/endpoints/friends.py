@@ -2,10 +2,12 @@
 Friends endpoints for friend requests and management
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 from typing import Optional
+from pydantic import TypeAdapter
 
 from app.models.friendship import (
     FriendRequestCreate,
@@ -15,40 +17,55 @@ from app.models.friendship import (
     FriendRequestListResponse,
     FriendshipStatus
 )
-from app.core import get_database, decode_access_token
+from app.models.user import ObjectIdStr
+from app.core import get_database
+from app.api.deps import get_current_user_id
 from app.core.websocket import manager
+from app.utils.responses import json_response
+from app.services.friends_cache_service import invalidate_friend_ids
 
 router = APIRouter()
 
+# List responses are assembled here, so they are serialized without re-validation
+_friend_list_adapter = TypeAdapter(FriendListResponse)
+_friend_request_list_adapter = TypeAdapter(FriendRequestListResponse)
 
-async def get_current_user_id(authorization: str = Header(...)) -> str:
-    """Dependency to get current user ID from token"""
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authorization header"
-        )
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
-    
-    return payload.get("user_id")
+# Friendship fields used by the list endpoints
+FRIENDSHIP_LIST_PROJECTION = {
+    "requester_id": 1,
+    "addressee_id": 1,
+    "status": 1,
+    "requested_at": 1,
+    "responded_at": 1
+}
+
+# User fields shown alongside a friend request
+FRIEND_REQUEST_USER_PROJECTION = {
+    "username": 1,
+    "profile.full_name": 1,
+    "profile.avatar_url": 1,
+    "profile.bio": 1
+}
+
+# User fields shown in the friends list
+FRIEND_USER_PROJECTION = {
+    **FRIEND_REQUEST_USER_PROJECTION,
+    "status.online": 1,
+    "status.last_seen": 1
+}
 
 
 @router.post("/request", response_model=FriendshipResponse, status_code=status.HTTP_201_CREATED)
 async def send_friend_request(
     data: FriendRequestCreate,
+    background_tasks: BackgroundTasks,
+    full: bool = True,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Send a friend request
     
+    - Pass full=false to get only the other user's ID back (skips the user lookup)
     - Cannot send request to yourself
     - Cannot send if already friends
     - Cannot send if blocked
@@ -57,7 +74,7 @@ async def send_friend_request(
     db = await get_database()
     
     # Validate target user exists
-    target_user = await db.users.find_one({"_id": ObjectId(data.user_id)})
+    target_user = await db.users.find_one({"_id": ObjectId(data.user_id)}, {"_id": 1})
     if not target_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -71,13 +88,29 @@ async def send_friend_request(
             detail="Cannot send friend request to yourself"
         )
     
-    # Check for existing friendship
-    existing = await db.friendships.find_one({
-        "$or": [
-            {"requester_id": current_user_id, "addressee_id": data.user_id},
-            {"requester_id": data.user_id, "addressee_id": current_user_id}
-        ]
-    })
+    # Create the request, or get the pair's existing friendship, in one atomic round-trip.
+    # The _id is generated here so an insert can be told apart from an existing match.
+    now = datetime.utcnow()
+    new_id = ObjectId()
+    friendship = await db.friendships.find_one_and_update(
+        {"pair_key": friendship_pair_key(current_user_id, data.user_id)},
+        {
+            "$setOnInsert": {
+                "_id": new_id,
+                "requester_id": current_user_id,
+                "addressee_id": data.user_id,
+                "status": FriendshipStatus.PENDING,
+                "requested_at": now,
+                "responded_at": None,
+                "updated_at": now,
+                "blocked_by": None
+            }
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    
+    existing = friendship if friendship["_id"] != new_id else None
     
     if existing:
         if existing["status"] == FriendshipStatus.BLOCKED:
@@ -104,42 +137,36 @@ async def send_friend_request(
                     detail="This user has already sent you a friend request. Please accept it instead."
                 )
         elif existing["status"] == FriendshipStatus.REJECTED:
-            # Allow resending after rejection
-            await db.friendships.update_one(
-                {"_id": existing["_id"]},
+            # Allow resending after rejection (the sender becomes the requester)
+            friendship = await db.friendships.find_one_and_update(
+                {"_id": existing["_id"], "status": FriendshipStatus.REJECTED},
                 {
                     "$set": {
+                        "requester_id": current_user_id,
+                        "addressee_id": data.user_id,
                         "status": FriendshipStatus.PENDING,
-                        "requested_at": datetime.utcnow(),
+                        "requested_at": now,
                         "responded_at": None,
-                        "updated_at": datetime.utcnow()
+                        "updated_at": now
                     }
-                }
+                },
+                return_document=ReturnDocument.AFTER
             )
+            if not friendship:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Friendship changed concurrently. Please try again."
+                )
             
-            # Notify via WebSocket
-            await notify_friend_request(data.user_id, current_user_id, str(existing["_id"]))
+            # Notify via WebSocket after the response is returned
+            background_tasks.add_task(notify_friend_request, data.user_id, current_user_id, str(friendship["_id"]))
             
-            return await format_friendship_response(existing, current_user_id, db, is_requester=True)
-    
-    # Create new friend request
-    friendship = {
-        "requester_id": current_user_id,
-        "addressee_id": data.user_id,
-        "status": FriendshipStatus.PENDING,
-        "requested_at": datetime.utcnow(),
-        "responded_at": None,
-        "updated_at": datetime.utcnow(),
-        "blocked_by": None
-    }
+            return await format_friendship_response(friendship, current_user_id, db, is_requester=True, full=full)
     
-    result = await db.friendships.insert_one(friendship)
-    friendship["_id"] = result.inserted_id
+    # Notify via WebSocket after the response is returned
+    background_tasks.add_task(notify_friend_request, data.user_id, current_user_id, str(friendship["_id"]))
     
-    # Notify via WebSocket
-    await notify_friend_request(data.user_id, current_user_id, str(result.inserted_id))
-    
-    return await format_friendship_response(friendship, current_user_id, db, is_requester=True)
+    return await format_friendship_response(friendship, current_user_id, db, is_requester=True, full=full)
 
 
 @router.get("/requests/received", response_model=FriendRequestListResponse)
@@ -162,18 +189,27 @@ async def get_received_requests(
     if status_filter:
         query["status"] = status_filter
     
-    requests = await db.friendships.find(query).sort("requested_at", -1).skip(skip).limit(limit).to_list(length=limit)
-    
-    total = await db.friendships.count_documents(query)
+    # Page + requester details and total count in one aggregation
+    requests, total = await aggregate_friendship_page(
+        db,
+        query,
+        {"requested_at": -1},
+        skip,
+        limit,
+        lookup_user_stages("$requester_id", FRIEND_REQUEST_USER_PROJECTION)
+    )
     
-    formatted_requests = []
-    for req in requests:
-        formatted = await format_friendship_response(req, current_user_id, db, is_requester=False)
-        formatted_requests.append(formatted)
+    formatted_requests = [
+        build_friendship_response(req, req.get("user"))
+        for req in requests
+    ]
     
-    return FriendRequestListResponse(
-        requests=formatted_requests,
-        total=total
+    return json_response(
+        _friend_request_list_adapter,
+        FriendRequestListResponse(
+            requests=formatted_requests,
+            total=total
+        )
     )
 
 
@@ -197,83 +233,98 @@ async def get_sent_requests(
     if status_filter:
         query["status"] = status_filter
     
-    requests = await db.friendships.find(query).sort("requested_at", -1).skip(skip).limit(limit).to_list(length=limit)
-    
-    total = await db.friendships.count_documents(query)
+    # Page + addressee details and total count in one aggregation
+    requests, total = await aggregate_friendship_page(
+        db,
+        query,
+        {"requested_at": -1},
+        skip,
+        limit,
+        lookup_user_stages("$addressee_id", FRIEND_REQUEST_USER_PROJECTION)
+    )
     
-    formatted_requests = []
-    for req in requests:
-        formatted = await format_friendship_response(req, current_user_id, db, is_requester=True)
-        formatted_requests.append(formatted)
+    formatted_requests = [
+        build_friendship_response(req, req.get("user"))
+        for req in requests
+    ]
     
-    return FriendRequestListResponse(
-        requests=formatted_requests,
-        total=total
+    return json_response(
+        _friend_request_list_adapter,
+        FriendRequestListResponse(
+            requests=formatted_requests,
+            total=total
+        )
     )
 
 
 @router.post("/requests/{friendship_id}/respond", response_model=FriendshipResponse)
 async def respond_to_friend_request(
-    friendship_id: str,
+    friendship_id: ObjectIdStr,
     data: FriendRequestRespond,
+    background_tasks: BackgroundTasks,
+    full: bool = True,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Respond to a friend request (accept or reject)
     
+    - Pass full=false to get only the other user's ID back (skips the user lookup)
     - Only the addressee can respond
     - Cannot respond to already responded requests
     """
     db = await get_database()
     
-    try:
-        friendship = await db.friendships.find_one({"_id": ObjectId(friendship_id)})
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid friendship ID"
-        )
-    
-    if not friendship:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Friend request not found"
-        )
-    
-    # Only addressee can respond
-    if friendship["addressee_id"] != current_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only the recipient can respond to this request"
-        )
-    
-    # Cannot respond if not pending
-    if friendship["status"] != FriendshipStatus.PENDING:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Request is already {friendship['status']}"
-        )
-    
-    # Update status
     new_status = FriendshipStatus.ACCEPTED if data.action == "accept" else FriendshipStatus.REJECTED
+    now = datetime.utcnow()
     
-    await db.friendships.update_one(
-        {"_id": ObjectId(friendship_id)},
+    # Check preconditions and update status atomically
+    friendship = await db.friendships.find_one_and_update(
+        {
+            "_id": ObjectId(friendship_id),
+            "addressee_id": current_user_id,
+            "status": FriendshipStatus.PENDING
+        },
         {
             "$set": {
                 "status": new_status,
-                "responded_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
+                "responded_at": now,
+                "updated_at": now
             }
-        }
+        },
+        return_document=ReturnDocument.AFTER
     )
     
-    friendship["status"] = new_status
-    friendship["responded_at"] = datetime.utcnow()
+    if not friendship:
+        # Cold path: re-read once to report why the update did not apply
+        friendship = await db.friendships.find_one(
+            {"_id": ObjectId(friendship_id)},
+            {"addressee_id": 1, "status": 1}
+        )
+        
+        if not friendship:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Friend request not found"
+            )
+        
+        # Only addressee can respond
+        if friendship["addressee_id"] != current_user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only the recipient can respond to this request"
+            )
+        
+        # Cannot respond if not pending
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Request is already {friendship['status']}"
+        )
     
-    # Notify requester via WebSocket
+    # Notify requester via WebSocket after the response is returned
     if new_status == FriendshipStatus.ACCEPTED:
-        await manager.send_to_user(
+        await invalidate_friend_ids(current_user_id, friendship["requester_id"])
+        background_tasks.add_task(
+            manager.send_to_user,
             {
                 "type": "friend_request_accepted",
                 "data": {
@@ -284,7 +335,7 @@ async def respond_to_friend_request(
             friendship["requester_id"]
         )
     
-    return await format_friendship_response(friendship, current_user_id, db, is_requester=False)
+    return await format_friendship_response(friendship, current_user_id, db, is_requester=False, full=full)
 
 
 @router.get("", response_model=FriendListResponse)
@@ -302,48 +353,55 @@ async def get_friends(
     """
     db = await get_database()
     
-    # Find accepted friendships where user is either requester or addressee
-    friendships = await db.friendships.find({
+    # Accepted friendships where user is either requester or addressee
+    query = {
         "$or": [
             {"requester_id": current_user_id, "status": FriendshipStatus.ACCEPTED},
             {"addressee_id": current_user_id, "status": FriendshipStatus.ACCEPTED}
         ]
-    }).sort("responded_at", -1).skip(skip).limit(limit).to_list(length=limit)
+    }
     
-    total = await db.friendships.count_documents({
-        "$or": [
-            {"requester_id": current_user_id, "status": FriendshipStatus.ACCEPTED},
-            {"addressee_id": current_user_id, "status": FriendshipStatus.ACCEPTED}
-        ]
-    })
+    # Page with each friend's user document, and the total count, in one aggregation
+    friendships, total = await aggregate_friendship_page(
+        db,
+        query,
+        {"responded_at": -1},
+        skip,
+        limit,
+        lookup_user_stages(
+            {"$cond": [{"$eq": ["$requester_id", current_user_id]}, "$addressee_id", "$requester_id"]},
+            FRIEND_USER_PROJECTION,
+            keep_missing=False
+        )
+    )
     
-    # Get friend details
+    # Friend details (friendships whose user no longer exists were dropped by $unwind)
     friends = []
     for friendship in friendships:
-        friend_id = friendship["addressee_id"] if friendship["requester_id"] == current_user_id else friendship["requester_id"]
-        
-        friend = await db.users.find_one({"_id": ObjectId(friend_id)})
-        if friend:
-            friends.append({
-                "id": str(friend["_id"]),
-                "username": friend["username"],
-                "full_name": friend["profile"]["full_name"],
-                "avatar_url": friend["profile"].get("avatar_url"),
-                "bio": friend["profile"].get("bio"),
-                "online": friend["status"].get("online", False),
-                "last_seen": friend["status"].get("last_seen"),
-                "friendship_since": friendship["responded_at"]
-            })
-    
-    return FriendListResponse(
-        friends=friends,
-        total=total
+        friend = friendship["user"]
+        friends.append({
+            "id": str(friend["_id"]),
+            "username": friend["username"],
+            "full_name": friend["profile"]["full_name"],
+            "avatar_url": friend["profile"].get("avatar_url"),
+            "bio": friend["profile"].get("bio"),
+            "online": friend["status"].get("online", False),
+            "last_seen": friend["status"].get("last_seen"),
+            "friendship_since": friendship["responded_at"]
+        })
+    
+    return json_response(
+        _friend_list_adapter,
+        FriendListResponse(
+            friends=friends,
+            total=total
+        )
     )
 
 
 @router.post("/{user_id}/block", status_code=status.HTTP_200_OK)
 async def block_user(
-    user_id: str,
+    user_id: ObjectIdStr,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """
@@ -356,7 +414,7 @@ async def block_user(
     db = await get_database()
     
     # Validate user exists
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 1})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -370,44 +428,35 @@ async def block_user(
             detail="Cannot block yourself"
         )
     
-    # Check for existing friendship
-    existing = await db.friendships.find_one({
-        "$or": [
-            {"requester_id": current_user_id, "addressee_id": user_id},
-            {"requester_id": user_id, "addressee_id": current_user_id}
-        ]
-    })
-    
-    if existing:
-        # Update to blocked
-        await db.friendships.update_one(
-            {"_id": existing["_id"]},
-            {
-                "$set": {
-                    "status": FriendshipStatus.BLOCKED,
-                    "blocked_by": current_user_id,
-                    "updated_at": datetime.utcnow()
-                }
+    # Block the existing friendship or create a blocked entry (single upsert)
+    now = datetime.utcnow()
+    await db.friendships.update_one(
+        {"pair_key": friendship_pair_key(current_user_id, user_id)},
+        {
+            "$set": {
+                "status": FriendshipStatus.BLOCKED,
+                "blocked_by": current_user_id,
+                "updated_at": now
+            },
+            "$setOnInsert": {
+                "requester_id": current_user_id,
+                "addressee_id": user_id,
+                "requested_at": now,
+                "responded_at": None
             }
-        )
-    else:
-        # Create new blocked entry
-        await db.friendships.insert_one({
-            "requester_id": current_user_id,
-            "addressee_id": user_id,
-            "status": FriendshipStatus.BLOCKED,
-            "blocked_by": current_user_id,
-            "requested_at": datetime.utcnow(),
-            "responded_at": None,
-            "updated_at": datetime.utcnow()
-        })
+        },
+        upsert=True
+    )
+    
+    # Blocking ends any friendship
+    await invalidate_friend_ids(current_user_id, user_id)
     
     return {"message": "User blocked successfully"}
 
 
 @router.delete("/{user_id}/unblock", status_code=status.HTTP_200_OK)
 async def unblock_user(
-    user_id: str,
+    user_id: ObjectIdStr,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """
@@ -419,35 +468,116 @@ async def unblock_user(
     """
     db = await get_database()
     
-    # Find blocked friendship
-    friendship = await db.friendships.find_one({
-        "$or": [
-            {"requester_id": current_user_id, "addressee_id": user_id, "status": FriendshipStatus.BLOCKED},
-            {"requester_id": user_id, "addressee_id": current_user_id, "status": FriendshipStatus.BLOCKED}
-        ],
+    # Delete the block (only the user who blocked can lift it)
+    result = await db.friendships.delete_one({
+        "pair_key": friendship_pair_key(current_user_id, user_id),
+        "status": FriendshipStatus.BLOCKED,
         "blocked_by": current_user_id
     })
     
-    if not friendship:
+    if result.deleted_count == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No block found for this user"
         )
     
-    # Delete the friendship record
-    await db.friendships.delete_one({"_id": friendship["_id"]})
-    
     return {"message": "User unblocked successfully"}
 
 
-async def format_friendship_response(friendship: dict, current_user_id: str, db, is_requester: bool) -> FriendshipResponse:
-    """Format friendship for response"""
+def friendship_pair_key(user_a: str, user_b: str) -> str:
+    """Order-independent key identifying the friendship between two users"""
+    return f"{user_a}:{user_b}" if user_a < user_b else f"{user_b}:{user_a}"
+
+
+async def aggregate_friendship_page(
+    db,
+    query: dict,
+    sort: dict,
+    skip: int,
+    limit: int,
+    page_stages: list
+) -> tuple:
+    """
+    Fetch a page of friendships and the total match count in a single round-trip
+    
+    Args:
+        db: Database instance
+        query: Friendship filter
+        sort: Sort spec (applied before $facet so it can use an index)
+        skip: Number of documents to skip
+        limit: Page size
+        page_stages: Extra stages run on the page only (e.g. user $lookup)
+        
+    Returns:
+        (page documents, total count)
+    """
+    result = await db.friendships.aggregate([
+        {"$match": query},
+        {"$sort": sort},
+        {"$facet": {
+            "page": [
+                {"$skip": skip},
+                {"$limit": limit},
+                {"$project": FRIENDSHIP_LIST_PROJECTION},
+                *page_stages
+            ],
+            "total": [{"$count": "n"}]
+        }}
+    ]).to_list(length=1)
+    
+    total = result[0]["total"][0]["n"] if result[0]["total"] else 0
+    return result[0]["page"], total
+
+
+def lookup_user_stages(user_id_expr, projection: dict, keep_missing: bool = True) -> list:
+    """
+    Aggregation stages joining a friendship with one of its users
+    
+    Args:
+        user_id_expr: Expression resolving to the (string) user ID to join
+        projection: User fields to return
+        keep_missing: Keep friendships whose user no longer exists (user is then absent)
+        
+    Returns:
+        Stages that add the projected user document as "user"
+    """
+    return [
+        {"$addFields": {"user_oid": {"$toObjectId": user_id_expr}}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_oid",
+            "foreignField": "_id",
+            "pipeline": [{"$project": projection}],
+            "as": "user"
+        }},
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": keep_missing}}
+    ]
+
+
+async def format_friendship_response(
+    friendship: dict,
+    current_user_id: str,
+    db,
+    is_requester: bool,
+    full: bool = True
+) -> FriendshipResponse:
+    """Format friendship for response (full=False returns only the other user's ID)"""
     
     # Get the other user's details
     other_user_id = friendship["addressee_id"] if is_requester else friendship["requester_id"]
     
-    user = await db.users.find_one({"_id": ObjectId(other_user_id)})
+    if not full:
+        response = build_friendship_response(friendship, None)
+        response.user = {"id": other_user_id}
+        return response
     
+    user = await db.users.find_one({"_id": ObjectId(other_user_id)}, FRIEND_REQUEST_USER_PROJECTION)
+    
+    return build_friendship_response(friendship, user)
+
+
+def build_friendship_response(friendship: dict, user: Optional[dict]) -> FriendshipResponse:
+    """Build a friendship response from the friendship and the other user's document"""
     user_details = {
         "id": str(user["_id"]),
         "username": user["username"],
@@ -469,7 +599,7 @@ async def notify_friend_request(addressee_id: str, requester_id: str, friendship
     """Notify user of new friend request via WebSocket"""
     db = await get_database()
     
-    requester = await db.users.find_one({"_id": ObjectId(requester_id)})
+    requester = await db.users.find_one({"_id": ObjectId(requester_id)}, FRIEND_REQUEST_USER_PROJECTION)
     
     if requester:
         await manager.send_to_user(
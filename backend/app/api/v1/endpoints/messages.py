@@ -2,10 +2,13 @@
 Message endpoints
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import datetime, timedelta
 from bson import ObjectId
 from typing import Optional
+from pydantic import TypeAdapter
+import asyncio
+import logging
 
 from app.models.message import (
     MessageCreate,
@@ -16,30 +19,35 @@ from app.models.message import (
     MessageMetadata,
     MessageStatus
 )
-from app.core import get_database, decode_access_token
+from app.models.user import ObjectIdStr
+from app.core import get_database
+from app.api.deps import get_current_user_id
 from app.core.websocket import manager
+from app.services.message_write_buffer import message_write_buffer
+from app.services.conversation_cache_service import get_conversation_participants
+from app.utils.responses import json_response
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Response models are built once in the handler and serialized straight to
+# JSON bytes, skipping FastAPI's re-validation against response_model
+_message_adapter = TypeAdapter(MessageResponse)
+_message_list_adapter = TypeAdapter(MessageListResponse)
 
-async def get_current_user_id(authorization: str = Header(...)) -> str:
-    """Dependency to get current user ID from token"""
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authorization header"
-        )
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
-    
-    return payload.get("user_id")
+# Fields read by format_message_response
+MESSAGE_RESPONSE_PROJECTION = {
+    "conversation_id": 1,
+    "sender_id": 1,
+    "encrypted_content": 1,
+    "content_type": 1,
+    "recipient_keys": 1,
+    "metadata": 1,
+    "status": 1,
+    "created_at": 1,
+    "deleted_for_everyone": 1
+}
 
 
 @router.post("", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
@@ -56,27 +64,35 @@ async def send_message(
     """
     db = await get_database()
     
-    # Validate conversation exists and user is a participant
     try:
-        conversation = await db.conversations.find_one({"_id": ObjectId(data.conversation_id)})
+        conversation_oid = ObjectId(data.conversation_id)
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid conversation ID"
         )
     
-    if not conversation:
+    # Conversation list preview, taken before anything else touches the payload
+    preview = data.preview
+    if preview is None:
+        preview = data.encrypted_content[:50] if data.encrypted_content else data.content[:50]
+    
+    # Participant check against the Redis-cached member set (empty if the conversation doesn't exist)
+    participant_ids = await get_conversation_participants(data.conversation_id, db)
+    if not participant_ids:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
-    if current_user_id not in conversation["participant_ids"]:
+    if current_user_id not in participant_ids:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not a participant in this conversation"
         )
     
+    message_id = ObjectId()
+    now = datetime.utcnow()
+    
     # Create message metadata
     metadata = {
         "media_url": data.media_url,
@@ -92,61 +108,87 @@ async def send_message(
     
     # Calculate expiry if ephemeral
     if data.is_ephemeral and data.ttl_seconds:
-        metadata["expires_at"] = datetime.utcnow() + timedelta(seconds=data.ttl_seconds)
+        metadata["expires_at"] = now + timedelta(seconds=data.ttl_seconds)
     
     # Create message
     message = {
+        "_id": message_id,
         "conversation_id": data.conversation_id,
         "sender_id": current_user_id,
         "content": data.content,  # Plaintext content
         "encrypted_content": data.encrypted_content,  # Encrypted content
         "content_type": data.content_type,
-        "recipient_keys": [rk.model_dump() for rk in data.recipient_keys],
+        "recipient_keys": data.recipient_keys,
         "metadata": metadata,
         "status": {
-            "sent_at": datetime.utcnow(),
+            "sent_at": now,
             "delivered_to": [],
             "read_by": []
         },
         "deleted_for": [],
         "deleted_for_everyone": False,
         "deleted_at": None,
-        "created_at": datetime.utcnow()
+        "created_at": now
     }
     
-    result = await db.messages.insert_one(message)
-    message["_id"] = result.inserted_id
+    response = format_message_response(message)
     
-    # Update conversation's last message
-    await db.conversations.update_one(
-        {"_id": ObjectId(data.conversation_id)},
-        {
-            "$set": {
-                "last_message": {
-                    "message_id": str(result.inserted_id),
-                    "encrypted_preview": data.encrypted_content[:50] if data.encrypted_content else data.content[:50],
-                    "timestamp": datetime.utcnow(),
-                    "sender_id": current_user_id
-                },
-                "metadata.updated_at": datetime.utcnow()
-            }
-        }
-    )
+    # Store first (batched with concurrent sends): the conversation preview, unread
+    # counts and recipients only ever see a message that exists
+    await message_write_buffer.insert(message)
     
-    # Broadcast to recipients via WebSocket
-    await manager.broadcast_to_conversation(
-        {
-            "type": "new_message",
-            "data": {
-                "message": format_message_response(message)
-            }
-        },
-        data.conversation_id,
-        conversation["participant_ids"],
-        exclude_user=None  # Send to all including sender (for multi-device)
+    # Update the conversation's last message and unread counts while broadcasting
+    await asyncio.gather(
+        update_conversation_last_message(conversation_oid, message_id, preview, now, current_user_id),
+        manager.broadcast_to_conversation(
+            {
+                "type": "new_message",
+                "data": {
+                    "message": response.model_dump(mode="json")
+                }
+            },
+            data.conversation_id,
+            participant_ids,
+            exclude_user=None  # Send to all including sender (for multi-device)
+        )
     )
     
-    return format_message_response(message)
+    return json_response(_message_adapter, response, status.HTTP_201_CREATED)
+
+
+async def update_conversation_last_message(
+    conversation_oid: ObjectId,
+    message_id: ObjectId,
+    preview: str,
+    now: datetime,
+    sender_id: str
+):
+    """
+    Point the conversation at a stored message and bump the other participants' unread counts
+    
+    The message is already stored, so a failure here is logged rather than failing
+    the send (a client retry would store the message twice).
+    """
+    db = await get_database()
+    try:
+        await db.conversations.update_one(
+            {"_id": conversation_oid},
+            {
+                "$set": {
+                    "last_message": {
+                        "message_id": str(message_id),
+                        "encrypted_preview": preview,
+                        "timestamp": now,
+                        "sender_id": sender_id
+                    },
+                    "metadata.updated_at": now
+                },
+                "$inc": {"participants.$[recipient].unread_count": 1}
+            },
+            array_filters=[{"recipient.user_id": {"$ne": sender_id}}]
+        )
+    except Exception as e:
+        logger.error(f"Failed to update conversation {conversation_oid} for message {message_id}: {e}")
 
 
 @router.get("/conversations/{conversation_id}/messages", response_model=MessageListResponse)
@@ -187,21 +229,21 @@ async def get_messages(
             detail="Not a participant in this conversation"
         )
     
-    # Build query
-    query = {
-        "conversation_id": conversation_id,
-        "deleted_for": {"$ne": current_user_id}
-    }
+    # Build query. The deleted_for filter is only needed once the user has deleted
+    # something here; participants created before the flag existed keep it.
+    query = {"conversation_id": conversation_id}
+    participant = next(
+        (p for p in conversation["participants"] if p["user_id"] == current_user_id),
+        {}
+    )
+    if participant.get("has_deletions", True):
+        query["deleted_for"] = {"$ne": current_user_id}
+    count_query = dict(query)
     
     # Add pagination and polling support
-    if before:
-        try:
-            # Pagination: Get older messages
-            before_message = await db.messages.find_one({"_id": ObjectId(before)})
-            if before_message:
-                query["created_at"] = {"$lt": before_message["created_at"]}
-        except:
-            pass
+    if before and ObjectId.is_valid(before):
+        # Pagination: Get older messages (ObjectIds increase with insert time)
+        query["_id"] = {"$lt": ObjectId(before)}
             
     if since:
         try:
@@ -212,27 +254,35 @@ async def get_messages(
             pass
     
     # Get messages
-    messages = await db.messages.find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
-    
-    # Get total count
-    total = await db.messages.count_documents({
-        "conversation_id": conversation_id,
-        "deleted_for": {"$ne": current_user_id}
-    })
+    messages_cursor = db.messages.find(query, MESSAGE_RESPONSE_PROJECTION).sort("_id", -1).limit(limit)
+    
+    # Total count scans the whole conversation, so only the first page pays for it
+    # (later pages and polls rely on has_more)
+    if not before and not since:
+        messages, total = await asyncio.gather(
+            messages_cursor.to_list(length=limit),
+            db.messages.count_documents(count_query)
+        )
+    else:
+        messages = await messages_cursor.to_list(length=limit)
+        total = None
     
     # Format responses
     formatted_messages = [format_message_response(msg) for msg in messages]
     
-    return MessageListResponse(
-        messages=formatted_messages,
-        has_more=len(messages) == limit,
-        total=total
+    return json_response(
+        _message_list_adapter,
+        MessageListResponse.model_construct(
+            messages=formatted_messages,
+            has_more=len(messages) == limit,
+            total=total
+        )
     )
 
 
 @router.post("/{message_id}/read", status_code=status.HTTP_200_OK)
 async def mark_message_read(
-    message_id: str,
+    message_id: ObjectIdStr,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """
@@ -242,38 +292,26 @@ async def mark_message_read(
     - Sends read receipt to sender via WebSocket
     """
     db = await get_database()
+    now = datetime.utcnow()
     
-    try:
-        message = await db.messages.find_one({"_id": ObjectId(message_id)})
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid message ID"
-        )
-    
-    if not message:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Message not found"
-        )
-    
-    # Check if already read by this user
-    already_read = any(r["user_id"] == current_user_id for r in message["status"].get("read_by", []))
-    
-    if not already_read:
-        # Update read status
-        await db.messages.update_one(
-            {"_id": ObjectId(message_id)},
-            {
-                "$push": {
-                    "status.read_by": {
-                        "user_id": current_user_id,
-                        "read_at": datetime.utcnow()
-                    }
+    # Record the read receipt unless this user already has one (checked server-side)
+    message = await db.messages.find_one_and_update(
+        {
+            "_id": ObjectId(message_id),
+            "status.read_by.user_id": {"$ne": current_user_id}
+        },
+        {
+            "$push": {
+                "status.read_by": {
+                    "user_id": current_user_id,
+                    "read_at": now
                 }
             }
-        )
-        
+        },
+        projection={"sender_id": 1, "conversation_id": 1}
+    )
+    
+    if message:
         # Send read receipt to sender
         if message["sender_id"] != current_user_id:
             await manager.send_to_user(
@@ -283,13 +321,21 @@ async def mark_message_read(
                         "message_id": message_id,
                         "status": "read",
                         "user_id": current_user_id,
-                        "timestamp": datetime.utcnow().isoformat()
+                        "timestamp": now.isoformat()
                     }
                 },
                 message["sender_id"]
             )
+    else:
+        # Already read, or missing
+        message = await db.messages.find_one({"_id": ObjectId(message_id)}, {"conversation_id": 1})
+        if not message:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Message not found"
+            )
     
-    # Update conversation last_read_at
+    # Update conversation last_read_at and reset unread counter
     await db.conversations.update_one(
         {
             "_id": ObjectId(message["conversation_id"]),
@@ -297,7 +343,8 @@ async def mark_message_read(
         },
         {
             "$set": {
-                "participants.$.last_read_at": datetime.utcnow()
+                "participants.$.last_read_at": now,
+                "participants.$.unread_count": 0
             }
         }
     )
@@ -318,6 +365,7 @@ async def delete_message(
     - delete_for_me: Delete only for current user
     """
     db = await get_database()
+    now = datetime.utcnow()
     
     try:
         message = await db.messages.find_one({"_id": ObjectId(message_id)})
@@ -342,7 +390,7 @@ async def delete_message(
             )
         
         # Check if message is within 1 hour
-        message_age = datetime.utcnow() - message["created_at"]
+        message_age = now - message["created_at"]
         if message_age > timedelta(hours=1):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -351,11 +399,11 @@ async def delete_message(
         
         # Mark as deleted for everyone
         await db.messages.update_one(
-            {"_id": ObjectId(message_id)},
+            {"_id": message["_id"]},
             {
                 "$set": {
                     "deleted_for_everyone": True,
-                    "deleted_at": datetime.utcnow()
+                    "deleted_at": now
                 }
             }
         )
@@ -378,20 +426,37 @@ async def delete_message(
         return {"message": "Message deleted for everyone"}
     
     else:
-        # Delete for current user only
-        await db.messages.update_one(
-            {"_id": ObjectId(message_id)},
-            {
-                "$addToSet": {"deleted_for": current_user_id}
-            }
+        # Delete for current user only, and flag the participant so reads
+        # start filtering deleted_for
+        await asyncio.gather(
+            db.messages.update_one(
+                {"_id": message["_id"]},
+                {
+                    "$addToSet": {"deleted_for": current_user_id}
+                }
+            ),
+            db.conversations.update_one(
+                {
+                    "_id": ObjectId(message["conversation_id"]),
+                    "participants.user_id": current_user_id
+                },
+                {
+                    "$set": {"participants.$.has_deletions": True}
+                }
+            )
         )
         
         return {"message": "Message deleted for you"}
 
 
 def format_message_response(message: dict) -> MessageResponse:
-    """Format message for response"""
-    return MessageResponse(
+    """
+    Format message for response
+    
+    Messages are only written by this module, so the document is trusted and
+    the response is built with model_construct (no validation).
+    """
+    return MessageResponse.model_construct(
         id=str(message["_id"]),
         conversation_id=message["conversation_id"],
         sender_id=message["sender_id"],
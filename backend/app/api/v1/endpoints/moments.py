@@ -1,33 +1,15 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Header
-from app.core import decode_access_token, get_database
+from fastapi import APIRouter, HTTPException, status, Depends
+from app.core import get_database
+from app.api.deps import get_current_user_id
 from app.core.websocket import manager
+from app.services.user_cache_service import get_user_cards
+from app.services.friends_cache_service import get_friend_ids
 from app.models.moment import MomentCreate, MomentResponse, Moment
-from app.models.user import UserResponse
-from typing import List, Optional
-from datetime import datetime
-from bson import ObjectId
+from datetime import datetime, timezone
+import asyncio
 
 router = APIRouter()
 
-async def get_current_user_id(authorization: str = Header(...)) -> str:
-    """Dependency to get current user ID from token"""
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authorization header"
-        )
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
-    
-    return payload.get("user_id")
-
 @router.post("", response_model=MomentResponse, status_code=status.HTTP_201_CREATED)
 async def create_moment(
     data: MomentCreate,
@@ -37,49 +19,57 @@ async def create_moment(
     Create a new moment and broadcast to friends
     """
     db = await get_database()
+    now = datetime.now(timezone.utc)
     
     # Create moment object
     moment = Moment(
         user_id=current_user_id,
+        created_at=now,
         **data.dict()
     )
     
+    # Load the author card and friend list together (both Redis-cached)
+    cards, friends = await asyncio.gather(
+        get_user_cards([current_user_id], db),
+        get_friend_ids(current_user_id, db)
+    )
+    
+    card = cards.get(current_user_id)
+    if not card:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # Store only once the author is known to exist
     result = await db.moments.insert_one(moment.dict(by_alias=True))
     moment.id = result.inserted_id
     
-    # Notification Flow
-    # 1. Find friends
-    user = await db.users.find_one({"_id": ObjectId(current_user_id)})
-    friends = [f["user_id"] for f in user.get("friends", []) if f["status"] == "accepted"]
+    author = {
+        "id": card["user_id"],
+        "username": card["username"],
+        "full_name": card["full_name"],
+        "avatar_url": card.get("avatar_url")
+    }
     
-    # 2. Broadcast to friends
+    # Broadcast to friends
     notification_data = {
          "type": "new_moment",
          "data": {
              "moment_id": str(moment.id),
-             "user": {
-                 "id": str(user["_id"]),
-                 "username": user["username"],
-                 "full_name": user["profile"]["full_name"],
-                 "avatar_url": user["profile"].get("avatar_url")
-             },
+             "user": author,
              "moment_type": moment.type,
              "created_at": moment.created_at.isoformat()
          }
     }
     
-    for friend_id in friends:
-        await manager.send_to_user(notification_data, friend_id)
-        
-    # Return formatted response
-    return MomentResponse(
+    # Encoded once, sent to all friends concurrently
+    await manager.send_to_users(notification_data, friends)
+    
+    # Return formatted response (the Moment was validated above)
+    return MomentResponse.model_construct(
         id=str(moment.id),
-        user={
-            "id": str(user["_id"]),
-            "username": user["username"],
-            "full_name": user["profile"]["full_name"],
-            "avatar_url": user["profile"].get("avatar_url")
-        },
+        user=author,
         type=moment.type,
         text_content=moment.text_content,
         media_url=moment.media_url,
@@ -89,7 +79,7 @@ async def create_moment(
         has_viewed=False,
         created_at=moment.created_at,
         expires_at=moment.expires_at,
-        time_remaining=int((moment.expires_at - datetime.utcnow()).total_seconds())
+        time_remaining=int((moment.expires_at - now).total_seconds())
     )
 
 
@@ -102,10 +92,7 @@ async def get_moments(
     """
     Get moments feed
     """
-    # ... (Actual implementation of feed logic would go here, stub for now as focus is POST)
-    # For now, let's keep the user's existing logic, just replaced the file content to inject POST.
-    # But wait, the previous file had a STUB for GET too. I should probably leave it as stub but ensure it returns LIST.
-    
+    # Feed is not implemented yet; returns an empty MomentListResponse-shaped body
     return {
         "moments_by_user": [], # Changed key to match MomentListResponse if used
         "total_users": 0
@@ -2,36 +2,37 @@
 User endpoints for search and discovery
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, UploadFile, File, Body
+from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File, Body
 from bson import ObjectId
-from typing import Optional
+from typing import Optional, Literal
+from datetime import datetime
 
-from app.core import get_database, decode_access_token
+from app.core import get_database
+from app.core.database import USERNAME_SEARCH_COLLATION
+from app.api.deps import get_current_user_id
 from app.models.user import UserResponse, UserUpdate, UserDetailResponse, UserProfile, UserPrivacy
 from app.utils.media import upload_image
 from app.utils.sanitization import sanitize_text
+from app.services.user_cache_service import invalidate_user_card
 
 router = APIRouter()
 
+# User fields in the public profile
+PUBLIC_PROFILE_PROJECTION = {
+    "username": 1,
+    "profile.full_name": 1,
+    "profile.avatar_url": 1,
+    "profile.bio": 1
+}
 
-async def get_current_user_id(authorization: str = Header(...)) -> str:
-    """Dependency to get current user ID from token"""
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authorization header"
-        )
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
-    
-    return payload.get("user_id")
+# User fields in the public key lookup
+PUBLIC_KEY_PROJECTION = {
+    "encryption.public_key": 1,
+    "encryption.key_version": 1,
+    "devices.device_id": 1,
+    "devices.device_name": 1,
+    "devices.public_key": 1
+}
 
 
 @router.put("/me", response_model=UserDetailResponse)
@@ -48,28 +49,21 @@ async def update_user_profile(
     if data.bio:
         data.bio = sanitize_text(data.bio)
         
-    update_data = {}
+    # Update profile fields that were provided
+    profile_fields = {
+        "profile.full_name": data.full_name,
+        "profile.bio": data.bio,  # Empty string clears the bio
+        "profile.address": data.address,
+        "profile.avatar_url": data.avatar_url
+    }
+    update_data = {key: value for key, value in profile_fields.items() if value is not None}
     
-    # Update profile fields
-    if data.full_name:
-        update_data["profile.full_name"] = data.full_name
-    if data.bio is not None: # Allow clearing bio
-        update_data["profile.bio"] = data.bio
-    if data.address:
-        update_data["profile.address"] = data.address
-    if data.avatar_url:
-        update_data["profile.avatar_url"] = data.avatar_url
-        
     # Update privacy settings
     if data.privacy:
-        if data.privacy.discoverable_by_email is not None:
-            update_data["privacy.discoverable_by_email"] = data.privacy.discoverable_by_email
-        if data.privacy.discoverable_by_username is not None:
-            update_data["privacy.discoverable_by_username"] = data.privacy.discoverable_by_username
-        if data.privacy.show_online_status is not None:
-            update_data["privacy.show_online_status"] = data.privacy.show_online_status
-        if data.privacy.read_receipts is not None:
-            update_data["privacy.read_receipts"] = data.privacy.read_receipts
+        update_data.update(
+            (f"privacy.{key}", value)
+            for key, value in data.privacy.model_dump(exclude_none=True).items()
+        )
             
     if not update_data:
         raise HTTPException(
@@ -91,8 +85,8 @@ async def update_user_profile(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-        
-    from datetime import datetime
+    
+    await invalidate_user_card(current_user_id)
     
     # Return updated user
     return UserDetailResponse(
@@ -118,7 +112,6 @@ async def upload_avatar(
     
     # Upload to Cloudinary
     try:
-        start_time = datetime.utcnow()
         upload_result = await upload_image(file, folder="habibti/avatars")
         avatar_url = upload_result["url"]
     except Exception as e:
@@ -144,6 +137,8 @@ async def upload_avatar(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    
+    await invalidate_user_card(current_user_id)
         
     return UserDetailResponse(
         id=str(result["_id"]),
@@ -159,7 +154,7 @@ async def upload_avatar(
 @router.get("/search", response_model=dict)
 async def search_users(
     q: str = Query(..., min_length=1, description="Search query"),
-    search_by: str = Query("username", regex=r'^(username|email|mobile)$'),
+    search_by: Literal["username", "email", "mobile"] = Query("username"),
     limit: int = Query(20, le=50),
     current_user_id: str = Depends(get_current_user_id)
 ):
@@ -175,9 +170,10 @@ async def search_users(
     
     # Build search query based on search type
     if search_by == "username":
-        # Case-insensitive username search
+        # Case-insensitive prefix search as an index range under the search collation
+        # (U+FFFF sorts after every character)
         query = {
-            "username": {"$regex": f"^{q}", "$options": "i"},
+            "username": {"$gte": q, "$lt": q + "\uffff"},
             "privacy.discoverable_by_username": True
         }
     
@@ -205,7 +201,11 @@ async def search_users(
     query["_id"] = {"$ne": ObjectId(current_user_id)}
     
     # Execute search
-    users = await db.users.find(query).limit(limit).to_list(length=limit)
+    users = await db.users.find(
+        query,
+        PUBLIC_PROFILE_PROJECTION,
+        collation=USERNAME_SEARCH_COLLATION if search_by == "username" else None
+    ).limit(limit).to_list(length=limit)
     
     # Format results (limited public info)
     results = []
@@ -240,7 +240,7 @@ async def get_user_profile(
     db = await get_database()
     
     try:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, PUBLIC_PROFILE_PROJECTION)
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -254,13 +254,7 @@ async def get_user_profile(
         )
     
     # Return limited public profile
-    return UserResponse(
-        id=str(user["_id"]),
-        username=user["username"],
-        full_name=user["profile"]["full_name"],
-        avatar_url=user["profile"].get("avatar_url"),
-        bio=user["profile"].get("bio")
-    )
+    return UserResponse.from_db(user)
 
 
 @router.get("/{user_id}/public-key", response_model=dict)
@@ -277,7 +271,7 @@ async def get_user_public_key(
     db = await get_database()
     
     try:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, PUBLIC_KEY_PROJECTION)
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -332,5 +326,6 @@ async def update_public_key(
             }
         }
     )
+    await invalidate_user_card(current_user_id)
     
     return {"message": "Public key updated successfully"}
@@ -4,16 +4,24 @@ WebSocket endpoint for real-time messaging
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
 from datetime import datetime
-from bson import ObjectId
 import logging
+import orjson
 
 from app.core.websocket import manager
-from app.core import decode_access_token, get_database, get_redis
+from app.services.message_status_buffer import message_status_buffer
+from app.services.conversation_cache_service import get_conversation_participants
+from app.services.friends_cache_service import get_friend_ids
+from app.services.user_cache_service import get_online_flags
+from app.services.presence_service import record_presence, refresh_presence
+from app.core import decode_access_token_cached, get_database
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Heartbeat reply, formatted directly instead of building and encoding a dict per ping
+PONG_TEMPLATE = '{"type":"pong","timestamp":"%s"}'
+
 
 @router.websocket("/ws")
 async def websocket_endpoint(
@@ -41,8 +49,8 @@ async def websocket_endpoint(
     - error: Error occurred
     """
     
-    # Authenticate user
-    payload = decode_access_token(token)
+    # Authenticate user (reconnects with the same token skip re-verification)
+    payload = decode_access_token_cached(token)
     if not payload:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
@@ -52,24 +60,12 @@ async def websocket_endpoint(
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
     
-    # Connect user
-    await manager.connect(websocket, user_id)
-    
-    # Update user online status in database
-    db = await get_database()
-    await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {
-            "$set": {
-                "status.online": True,
-                "status.last_seen": datetime.utcnow()
-            }
-        }
-    )
+    # Connect user (refused when this worker is at capacity)
+    if not await manager.connect(websocket, user_id):
+        return
     
-    # Store online status in Redis (for quick lookup)
-    redis = await get_redis()
-    await redis.setex(f"user:online:{user_id}", 3600, "1")  # 1 hour expiry
+    # Online in Redis now; last seen is persisted to MongoDB in the next batch
+    await record_presence(user_id, True)
     
     # Notify contacts that user is online
     await notify_contacts_status(user_id, True)
@@ -77,7 +73,7 @@ async def websocket_endpoint(
     try:
         while True:
             # Receive message from client
-            data = await websocket.receive_json()
+            data = orjson.loads(await websocket.receive_text())
             
             event_type = data.get("type")
             event_data = data.get("data", {})
@@ -98,9 +94,10 @@ async def websocket_endpoint(
                 await handle_message_read(user_id, event_data)
             
             elif event_type == "ping":
-                # Heartbeat
+                # Heartbeat (also keeps the user's presence entry fresh)
+                await refresh_presence([user_id])
                 await manager.send_personal_message(
-                    {"type": "pong", "timestamp": datetime.utcnow().isoformat()},
+                    PONG_TEMPLATE % datetime.utcnow().isoformat(),
                     websocket
                 )
             
@@ -124,23 +121,10 @@ async def websocket_endpoint(
         # Disconnect user
         manager.disconnect(websocket)
         
-        # Update user offline status
-        is_still_online = manager.is_user_online(user_id)
+        # Offline once no worker holds a connection for the user (counted in Redis)
+        remaining_connections = await record_presence(user_id, False)
         
-        if not is_still_online:
-            await db.users.update_one(
-                {"_id": ObjectId(user_id)},
-                {
-                    "$set": {
-                        "status.online": False,
-                        "status.last_seen": datetime.utcnow()
-                    }
-                }
-            )
-            
-            # Remove from Redis
-            await redis.delete(f"user:online:{user_id}")
-            
+        if not remaining_connections:
             # Notify contacts that user is offline
             await notify_contacts_status(user_id, False)
 
@@ -152,16 +136,15 @@ async def handle_typing_start(user_id: str, data: dict):
     if not conversation_id:
         return
     
-    # Get conversation participants
+    # Get conversation participants (Redis-cached)
     db = await get_database()
-    conversation = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
+    participant_ids = await get_conversation_participants(conversation_id, db)
     
-    if not conversation:
+    # Only participants can signal typing
+    if user_id not in participant_ids:
         return
     
     # Broadcast typing indicator to other participants
-    participant_ids = [p["user_id"] for p in conversation["participants"]]
-    
     await manager.broadcast_to_conversation(
         {
             "type": "typing_indicator",
@@ -184,16 +167,15 @@ async def handle_typing_stop(user_id: str, data: dict):
     if not conversation_id:
         return
     
-    # Get conversation participants
+    # Get conversation participants (Redis-cached)
     db = await get_database()
-    conversation = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
+    participant_ids = await get_conversation_participants(conversation_id, db)
     
-    if not conversation:
+    # Only participants can signal typing
+    if user_id not in participant_ids:
         return
     
     # Broadcast typing stopped to other participants
-    participant_ids = [p["user_id"] for p in conversation["participants"]]
-    
     await manager.broadcast_to_conversation(
         {
             "type": "typing_indicator",
@@ -216,38 +198,8 @@ async def handle_message_delivered(user_id: str, data: dict):
     if not message_id:
         return
     
-    db = await get_database()
-    
-    # Update message delivery status
-    await db.messages.update_one(
-        {"_id": ObjectId(message_id)},
-        {
-            "$push": {
-                "status.delivered_to": {
-                    "user_id": user_id,
-                    "delivered_at": datetime.utcnow()
-                }
-            }
-        }
-    )
-    
-    # Get message to find sender
-    message = await db.messages.find_one({"_id": ObjectId(message_id)})
-    
-    if message:
-        # Notify sender about delivery
-        await manager.send_to_user(
-            {
-                "type": "message_status_update",
-                "data": {
-                    "message_id": message_id,
-                    "status": "delivered",
-                    "user_id": user_id,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-            },
-            message["sender_id"]
-        )
+    # Written in batches; the sender is notified once the batch is stored
+    await message_status_buffer.add(message_id, user_id, "delivered")
 
 
 async def handle_message_read(user_id: str, data: dict):
@@ -257,38 +209,8 @@ async def handle_message_read(user_id: str, data: dict):
     if not message_id:
         return
     
-    db = await get_database()
-    
-    # Update message read status
-    await db.messages.update_one(
-        {"_id": ObjectId(message_id)},
-        {
-            "$push": {
-                "status.read_by": {
-                    "user_id": user_id,
-                    "read_at": datetime.utcnow()
-                }
-            }
-        }
-    )
-    
-    # Get message to find sender
-    message = await db.messages.find_one({"_id": ObjectId(message_id)})
-    
-    if message:
-        # Notify sender about read receipt
-        await manager.send_to_user(
-            {
-                "type": "message_status_update",
-                "data": {
-                    "message_id": message_id,
-                    "status": "read",
-                    "user_id": user_id,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-            },
-            message["sender_id"]
-        )
+    # Written in batches; the sender is notified once the batch is stored
+    await message_status_buffer.add(message_id, user_id, "read")
 
 
 async def notify_contacts_status(user_id: str, is_online: bool):
@@ -296,16 +218,16 @@ async def notify_contacts_status(user_id: str, is_online: bool):
     try:
         db = await get_database()
         
-        # Find confirmed friends
-        user = await db.users.find_one(
-            {"_id": ObjectId(user_id)},
-            {"friends": 1}
-        )
-        
-        if not user or "friends" not in user:
+        # Confirmed friends (Redis-cached)
+        friend_ids = await get_friend_ids(user_id, db)
+        if not friend_ids:
             return
-            
-        friend_ids = [f["user_id"] for f in user["friends"] if f["status"] == "accepted"]
+        
+        # Keep only friends who are online, in one Redis round-trip
+        online_flags = await get_online_flags(friend_ids)
+        online_friend_ids = [
+            friend_id for friend_id, is_friend_online in zip(friend_ids, online_flags) if is_friend_online
+        ]
         
         # Broadcast status content
         status_event = {
@@ -316,10 +238,8 @@ async def notify_contacts_status(user_id: str, is_online: bool):
             }
         }
         
-        # Notify each online friend
-        for friend_id in friend_ids:
-            if manager.is_user_online(friend_id):
-                await manager.send_to_user(status_event, friend_id)
+        # Encoded once and sent to every online friend concurrently
+        await manager.send_to_users(status_event, online_friend_ids)
                 
     except Exception as e:
         logger.error(f"Error notifying contacts: {e}")
@@ -6,9 +6,9 @@ from app.core.redis import cache, connect_to_redis, close_redis_connection, get_
 from app.core.security import (
     create_access_token,
     decode_access_token,
+    decode_access_token_cached,
     generate_otp,
     hash_otp,
-    verify_otp,
     generate_session_token,
     hash_password,
     verify_password
@@ -26,9 +26,9 @@ __all__ = [
     "get_redis",
     "create_access_token",
     "decode_access_token",
+    "decode_access_token_cached",
     "generate_otp",
     "hash_otp",
-    "verify_otp",
     "generate_session_token",
     "hash_password",
     "verify_password",
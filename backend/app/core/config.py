@@ -3,7 +3,8 @@ Application configuration and settings
 """
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import FrozenSet, List
+from functools import cached_property
 
 
 class Settings(BaseSettings):
@@ -22,9 +23,14 @@ class Settings(BaseSettings):
     # Database
     MONGODB_URI: str
     MONGODB_DB_NAME: str = "habibti"
+    MONGODB_MAX_POOL_SIZE: int = 50
+    MONGODB_MIN_POOL_SIZE: int = 5
+    MONGODB_MAX_IDLE_TIME_MS: int = 60000
     
     # Redis
     REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: int = 5
     
     # Authentication
     JWT_SECRET: str = ""
@@ -66,11 +72,16 @@ class Settings(BaseSettings):
         if self.SMTP_PASSWORD:
             self.SMTP_PASSWORD = self.SMTP_PASSWORD.replace(" ", "")
     
-    @property
+    @cached_property
     def cors_origins_list(self) -> List[str]:
-        """Parse CORS origins into a list"""
+        """Parse CORS origins into a list (once; settings don't change at runtime)"""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
     
+    @cached_property
+    def cors_origins_set(self) -> FrozenSet[str]:
+        """CORS origins as a set, so the per-request origin check is a hash lookup"""
+        return frozenset(self.cors_origins_list)
+    
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
     
@@ -2,7 +2,7 @@
 Database connection and initialization
 """
 
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
 from app.core.config import settings
 import logging
 import certifi
@@ -19,6 +19,16 @@ class Database:
 
 db = Database()
 
+# Case-insensitive collation for username prefix search (index and query must match)
+USERNAME_SEARCH_COLLATION = {"locale": "en", "strength": 2}
+
+# Mobile numbers are unique among users that have one. Older deployments built this
+# index under the same name as sparse-only (startup) or unique-only (init_db).
+MOBILE_INDEX_NAME = "profile.mobile_1"
+
+# Moments expire through a TTL index; startup used to build it as a plain index under the same name
+MOMENTS_EXPIRY_INDEX_NAME = "expires_at_1"
+
 
 async def connect_to_mongo():
     """Connect to MongoDB"""
@@ -26,7 +36,10 @@ async def connect_to_mongo():
     db.client = AsyncIOMotorClient(
         settings.MONGODB_URI,
         tlsCAFile=certifi.where(),
-        tls=True
+        tls=True,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS
     )
     db.db = db.client[settings.MONGODB_DB_NAME]
     logger.info(f"Connected to MongoDB: {settings.MONGODB_DB_NAME}")
@@ -35,31 +48,157 @@ async def connect_to_mongo():
     await create_indexes()
 
 
+async def migrate_mobile_index(users: AsyncIOMotorCollection):
+    """
+    Drop a profile.mobile index built with older options
+    
+    MongoDB rejects a changed definition under an existing index name, so the
+    unique + sparse index can only be built once the old one is gone.
+    
+    Args:
+        users: Users collection
+    """
+    existing = (await users.index_information()).get(MOBILE_INDEX_NAME)
+    if existing and not (existing.get("unique") and existing.get("sparse")):
+        logger.info("Rebuilding profile.mobile index as unique + sparse")
+        await users.drop_index(MOBILE_INDEX_NAME)
+
+
+async def migrate_moments_expiry_index(moments: AsyncIOMotorCollection):
+    """
+    Drop a moments expires_at index built without a TTL
+    
+    Args:
+        moments: Moments collection
+    """
+    existing = (await moments.index_information()).get(MOMENTS_EXPIRY_INDEX_NAME)
+    if existing and "expireAfterSeconds" not in existing:
+        logger.info("Rebuilding moments expires_at index as a TTL index")
+        await moments.drop_index(MOMENTS_EXPIRY_INDEX_NAME)
+
+
+async def backfill_conversation_pair_keys(database: AsyncIOMotorDatabase):
+    """
+    Set pair_key ("<lower id>:<higher id>") on one-to-one conversations created before it existed
+    
+    Conversation creation upserts on pair_key alone, so this has to run before
+    it can see older documents (idempotent: only documents without a key match).
+    participant_ids has always been stored sorted.
+    
+    Args:
+        database: Database instance
+    """
+    await database.conversations.update_many(
+        {"type": "one_to_one", "pair_key": {"$exists": False}},
+        [{"$set": {"pair_key": {"$concat": [
+            {"$arrayElemAt": ["$participant_ids", 0]},
+            ":",
+            {"$arrayElemAt": ["$participant_ids", 1]}
+        ]}}}]
+    )
+
+
+async def backfill_friendship_pair_keys(database: AsyncIOMotorDatabase):
+    """
+    Set pair_key ("<lower id>:<higher id>") on friendships created before it existed
+    
+    The friendship upserts match on pair_key alone, so this has to run before
+    they can see older documents (idempotent: only documents without a key match).
+    
+    Args:
+        database: Database instance
+    """
+    await database.friendships.update_many(
+        {"pair_key": {"$exists": False}},
+        [{"$set": {"pair_key": {"$cond": [
+            {"$lt": ["$requester_id", "$addressee_id"]},
+            {"$concat": ["$requester_id", ":", "$addressee_id"]},
+            {"$concat": ["$addressee_id", ":", "$requester_id"]}
+        ]}}}]
+    )
+
+
+async def _create_index(collection: AsyncIOMotorCollection, keys, **kwargs):
+    """Create one index, logging failures so they don't skip the remaining indexes"""
+    try:
+        await collection.create_index(keys, **kwargs)
+    except Exception as e:
+        logger.error(f"Error creating index {keys} on {collection.name}: {e}")
+
+
 async def create_indexes():
     """Create database indexes for performance"""
     try:
-        # Users
-        await db.db.users.create_index("email", unique=True)
-        await db.db.users.create_index("username", unique=True)
-        await db.db.users.create_index("profile.mobile", sparse=True)
-        
-        # Friendships
-        await db.db.friendships.create_index([("requester_id", 1), ("addressee_id", 1)], unique=True)
-        await db.db.friendships.create_index("status")
-        
-        # Messages
-        await db.db.messages.create_index([("conversation_id", 1), ("created_at", -1)])
-        
-        # Moments (TTL index for auto-expiry)
-        # Note: We implement logical expiry, but TTL is good for cleanup.
-        # But we soft-delete first usually. Let's just index user_id and expires_at.
-        await db.db.moments.create_index("user_id")
-        await db.db.moments.create_index("expires_at")
-        
-        logger.info("Database indexes created")
+        await migrate_mobile_index(db.db.users)
     except Exception as e:
-        logger.error(f"Error creating indexes: {e}")
-
+        logger.error(f"Error migrating profile.mobile index: {e}")
+    try:
+        await migrate_moments_expiry_index(db.db.moments)
+    except Exception as e:
+        logger.error(f"Error migrating moments expires_at index: {e}")
+    
+    # Pair keys on older documents, ahead of the unique pair_key indexes
+    try:
+        await backfill_friendship_pair_keys(db.db)
+    except Exception as e:
+        logger.error(f"Error backfilling friendship pair keys: {e}")
+    try:
+        await backfill_conversation_pair_keys(db.db)
+    except Exception as e:
+        logger.error(f"Error backfilling conversation pair keys: {e}")
+    
+    # Users
+    await _create_index(db.db.users, "email", unique=True)
+    await _create_index(db.db.users, "username", unique=True)
+    await _create_index(db.db.users, "username", name="username_ci", collation=USERNAME_SEARCH_COLLATION)
+    await _create_index(db.db.users, "profile.mobile", unique=True, sparse=True)
+    
+    # Friendships
+    await _create_index(db.db.friendships, [("requester_id", 1), ("addressee_id", 1)], unique=True)
+    # One friendship per pair of users (upsert target; older documents backfilled above)
+    await _create_index(
+        db.db.friendships,
+        "pair_key",
+        unique=True,
+        partialFilterExpression={"pair_key": {"$type": "string"}}
+    )
+    await _create_index(db.db.friendships, "status")
+    # Friends list: one index per $or branch, both ending in the sort key
+    await _create_index(db.db.friendships, [("requester_id", 1), ("status", 1), ("responded_at", -1)])
+    await _create_index(db.db.friendships, [("addressee_id", 1), ("status", 1), ("responded_at", -1)])
+    # Sent / received request lists sorted by requested_at
+    await _create_index(db.db.friendships, [("requester_id", 1), ("requested_at", -1)])
+    await _create_index(db.db.friendships, [("addressee_id", 1), ("requested_at", -1)])
+    
+    # Conversations
+    # List query: filter by participant, index-backed sort on updated_at
+    await _create_index(db.db.conversations, [("participant_ids", 1), ("metadata.updated_at", -1)])
+    # One conversation per pair of users (upsert target; older documents backfilled above)
+    await _create_index(
+        db.db.conversations,
+        "pair_key",
+        unique=True,
+        partialFilterExpression={"pair_key": {"$type": "string"}}
+    )
+    
+    # Messages
+    await _create_index(db.db.messages, [("conversation_id", 1), ("created_at", -1)])
+    await _create_index(db.db.messages, [("conversation_id", 1), ("_id", -1)])  # Newest-first paging
+    # Ephemeral messages are deleted by MongoDB's TTL monitor once metadata.expires_at passes
+    await _create_index(
+        db.db.messages,
+        "metadata.expires_at",
+        expireAfterSeconds=0,
+        partialFilterExpression={"metadata.is_ephemeral": True}
+    )
+    
+    # Moments (TTL index for auto-expiry)
+    # Note: We implement logical expiry, but TTL is good for cleanup.
+    # Same definition as init_db: the TTL index also serves expires_at queries.
+    await _create_index(db.db.moments, "user_id")
+    await _create_index(db.db.moments, "expires_at", expireAfterSeconds=0)
+    
+    logger.info("Database indexes created")
 
 
 async def close_mongo_connection():
@@ -2,9 +2,14 @@
 Logging configuration
 """
 import logging
+import logging.handlers
+import queue
 import sys
 from app.core import settings
 
+# Records waiting for the writer thread; beyond this, new records are dropped
+LOG_QUEUE_MAX_SIZE = 10000
+
 class EndpointFilter(logging.Filter):
     """
     Filter out health check endpoints from logs
@@ -12,8 +17,23 @@ class EndpointFilter(logging.Filter):
     def filter(self, record: logging.LogRecord) -> bool:
         return record.getMessage().find("/health") == -1
 
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the writer thread without ever blocking the event loop
+    """
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
 def setup_logging():
-    """Configure structured logging"""
+    """
+    Configure structured logging
+    
+    Log calls only enqueue the record; a QueueListener thread (started and
+    stopped in the app lifespan) formats it and writes to stdout.
+    """
     logger = logging.getLogger("habibti")
     logger.setLevel(getattr(logging, settings.LOG_LEVEL))
     
@@ -28,13 +48,15 @@ def setup_logging():
     console_handler.setFormatter(formatter)
     
     # Remove existing handlers
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX_SIZE)
     logger.handlers = []
-    logger.addHandler(console_handler)
+    logger.addHandler(DroppingQueueHandler(log_queue))
     
     # Filter health checks from access logs if using uvicorn
     logging.getLogger("uvicorn.access").addFilter(EndpointFilter())
     
-    return logger
+    listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+    return logger, listener
 
-# Global logger
-logger = setup_logging()
+# Global logger and its writer thread
+logger, log_listener = setup_logging()
@@ -1,24 +1,67 @@
 """
 Custom middlewares
 """
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import logging
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+logger = logging.getLogger("habibti")
+
+
+class AccessLogMiddleware:
     """
-    Add security headers to all responses
+    Log each HTTP request and its response status
+    
+    Plain ASGI middleware: no Request object, and no extra task/stream per
+    request as with BaseHTTPMiddleware.
     """
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not logger.isEnabledFor(logging.INFO):
+            await self.app(scope, receive, send)
+            return
+        
+        query = scope.get("query_string", b"")
+        path = scope["path"] + ("?" + query.decode("latin-1") if query else "")
+        logger.info("Request: %s %s", scope["method"], path)
+        
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                logger.info("Response: %s", message["status"])
+            await send(message)
         
-        # Security Headers
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        await self.app(scope, receive, send_wrapper)
+
+
+class SecurityHeadersMiddleware:
+    """
+    Add security headers to all responses
+    
+    The headers are static, so they are encoded once and appended to each
+    response start message as raw ASGI header pairs.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._headers = [
+            (b"x-frame-options", b"DENY"),
+            (b"x-content-type-options", b"nosniff"),
+            (b"x-xss-protection", b"1; mode=block"),
+            (b"referrer-policy", b"strict-origin-when-cross-origin"),
+            # Strict-Transport-Security (HSTS) - 1 year
+            # Only apply if request is secure (https) or in production
+            # (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+        ]
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Strict-Transport-Security (HSTS) - 1 year
-        # Only apply if request is secure (https) or in production
-        # headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # New list: the response's own header list must not be mutated
+                message["headers"] = [*message.get("headers", ()), *self._headers]
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_wrapper)
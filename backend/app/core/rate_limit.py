@@ -3,9 +3,17 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi.responses import JSONResponse
+from app.core.config import settings
 
 # Global limiter instance
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in Redis so limits hold across workers; the moving window
+# avoids the burst allowed at fixed-window boundaries.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.REDIS_URL,
+    strategy="moving-window",
+    enabled=settings.RATE_LIMIT_ENABLED
+)
 
 def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Response:
     """
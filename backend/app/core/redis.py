@@ -12,6 +12,7 @@ logger = logging.getLogger(__name__)
 class RedisCache:
     """Redis cache connection manager"""
     
+    pool: redis.BlockingConnectionPool = None
     redis_client: redis.Redis = None
 
 
@@ -21,11 +22,18 @@ cache = RedisCache()
 async def connect_to_redis():
     """Connect to Redis"""
     logger.info("Connecting to Redis...")
-    cache.redis_client = await redis.from_url(
+    
+    # Bounded pool shared by every caller; when all connections are busy,
+    # callers wait up to the timeout instead of opening more sockets
+    cache.pool = redis.BlockingConnectionPool.from_url(
         settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
         encoding="utf-8",
         decode_responses=True
     )
+    cache.redis_client = redis.Redis(connection_pool=cache.pool)
+    await cache.redis_client.ping()
     logger.info("Connected to Redis")
 
 
@@ -33,6 +41,7 @@ async def close_redis_connection():
     """Close Redis connection"""
     logger.info("Closing Redis connection...")
     await cache.redis_client.close()
+    await cache.pool.disconnect()
     logger.info("Redis connection closed")
 
 
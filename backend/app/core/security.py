@@ -2,16 +2,27 @@
 Security utilities for authentication and encryption
 """
 
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, Dict, Any, Tuple
+import jwt
+from jwt import InvalidTokenError
 from app.core.config import settings
+import bcrypt
 import secrets
 import hashlib
+import time
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt only uses the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+# HMAC key encoded once instead of on every sign/verify
+_JWT_SECRET_BYTES = settings.JWT_SECRET.encode()
+
+# Verified token payloads (token digest -> (payload, exp epoch)), least recently used first.
+# Keyed by a short digest so the cache doesn't hold raw bearer tokens.
+TOKEN_CACHE_MAX_SIZE = 8192
+_token_cache: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -37,7 +48,7 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     
     encoded_jwt = jwt.encode(
         to_encode,
-        settings.JWT_SECRET,
+        _JWT_SECRET_BYTES,
         algorithm=settings.JWT_ALGORITHM
     )
     
@@ -57,22 +68,61 @@ def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
     try:
         payload = jwt.decode(
             token,
-            settings.JWT_SECRET,
-            algorithms=[settings.JWT_ALGORITHM]
+            _JWT_SECRET_BYTES,
+            algorithms=[settings.JWT_ALGORITHM],
+            options={"require": ["exp"]}
         )
         return payload
-    except JWTError:
+    except InvalidTokenError:
         return None
 
 
+def decode_access_token_cached(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Decode and verify JWT token, reusing the result for repeat requests
+    
+    A cached payload is only served until the token's own expiry, so this
+    never accepts a token that decode_access_token would reject.
+    
+    Args:
+        token: JWT token to decode
+        
+    Returns:
+        Decoded payload or None if invalid
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    
+    cached = _token_cache.get(key)
+    if cached is not None:
+        payload, expires_at = cached
+        if expires_at > time.time():
+            _token_cache.move_to_end(key)
+            return payload
+        _token_cache.pop(key, None)
+    
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    
+    _token_cache[key] = (payload, float(payload["exp"]))
+    if len(_token_cache) > TOKEN_CACHE_MAX_SIZE:
+        _token_cache.popitem(last=False)
+    
+    return payload
+
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode()[:BCRYPT_MAX_PASSWORD_BYTES], bcrypt.gensalt()).decode()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return bcrypt.checkpw(plain_password.encode()[:BCRYPT_MAX_PASSWORD_BYTES], hashed_password.encode())
+    except ValueError:
+        # Malformed stored hash
+        return False
 
 
 def generate_otp(length: int = 6) -> str:
@@ -85,7 +135,8 @@ def generate_otp(length: int = 6) -> str:
     Returns:
         Random numeric OTP string
     """
-    return ''.join([str(secrets.randbelow(10)) for _ in range(length)])
+    # One CSPRNG draw over the whole range, zero-padded (uniform over all codes)
+    return f"{secrets.randbelow(10 ** length):0{length}d}"
 
 
 def hash_otp(otp: str) -> str:
@@ -101,20 +152,6 @@ def hash_otp(otp: str) -> str:
     return hashlib.sha256(otp.encode()).hexdigest()
 
 
-def verify_otp(plain_otp: str, hashed_otp: str) -> bool:
-    """
-    Verify OTP against its hash
-    
-    Args:
-        plain_otp: Plain OTP entered by user
-        hashed_otp: Stored hash
-        
-    Returns:
-        True if OTP matches
-    """
-    return hash_otp(plain_otp) == hashed_otp
-
-
 def generate_session_token() -> str:
     """Generate a secure random session token"""
     return secrets.token_urlsafe(32)
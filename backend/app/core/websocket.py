@@ -3,43 +3,94 @@ WebSocket Connection Manager
 Handles real-time connections for messaging
 """
 
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Set, Optional
+from fastapi import WebSocket, WebSocketDisconnect, status
+from typing import Dict, List, Set, Optional, Union, Iterable
 from datetime import datetime
-import json
+import asyncio
 import logging
+import orjson
 from bson import ObjectId
+from app.core.redis import get_redis
 
 logger = logging.getLogger(__name__)
 
+# Sends awaited together before yielding the event loop back to other tasks
+SEND_BATCH_SIZE = 50
+
+# Connection caps per worker; beyond the per-user cap the oldest device is dropped
+MAX_CONNECTIONS_PER_USER = 5
+MAX_TOTAL_CONNECTIONS = 10000
+
+# Pub/sub channel carrying "<user_id>,<user_id>...\n<payload>" to every worker
+WS_DELIVERY_CHANNEL = "ws:deliver"
+
+
+def encode_message(message: dict) -> str:
+    """
+    Serialize a WebSocket message once so it can be sent to many sockets
+    
+    Args:
+        message: Message dict
+        
+    Returns:
+        JSON text frame payload
+    """
+    return orjson.dumps(message, default=str).decode()
+
 
 class ConnectionManager:
     """Manages WebSocket connections for real-time messaging"""
     
     def __init__(self):
-        # user_id -> Set of WebSocket connections (multi-device support)
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # user_id -> WebSocket connections in connect order (multi-device support;
+        # a dict so the oldest device can be evicted first)
+        self.active_connections: Dict[str, Dict[WebSocket, None]] = {}
         
-        # websocket -> user_id mapping
-        self.connection_users: Dict[WebSocket, str] = {}
+        # Sockets across all users (each socket carries its own user_id in websocket.state)
+        self.connection_count = 0
+        
+        # Redis subscription delivering messages published by any worker
+        self._listener_task: Optional[asyncio.Task] = None
+        
+        # In-flight local deliveries started by the listener (held so they aren't garbage collected)
+        self._delivery_tasks: Set[asyncio.Task] = set()
     
-    async def connect(self, websocket: WebSocket, user_id: str):
+    async def connect(self, websocket: WebSocket, user_id: str) -> bool:
         """
         Connect a user's WebSocket
         
         Args:
             websocket: WebSocket connection
             user_id: User ID
+            
+        Returns:
+            False if the worker is at capacity and the socket was refused
         """
+        # Refuse before accepting so a full worker holds no extra socket buffers
+        if self.connection_count >= MAX_TOTAL_CONNECTIONS:
+            logger.warning(f"Connection limit reached, refusing user {user_id}")
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return False
+        
         await websocket.accept()
         
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = set()
+        connections = self.active_connections.setdefault(user_id, {})
+        
+        # Evict the user's oldest device once they are at the per-user cap
+        while len(connections) >= MAX_CONNECTIONS_PER_USER:
+            oldest = next(iter(connections))
+            self.disconnect(oldest)
+            try:
+                await oldest.close(code=status.WS_1008_POLICY_VIOLATION, reason="Too many connections")
+            except Exception:
+                pass
+            connections = self.active_connections.setdefault(user_id, {})
         
-        self.active_connections[user_id].add(websocket)
-        self.connection_users[websocket] = user_id
+        websocket.state.user_id = user_id
+        connections[websocket] = None
+        self.connection_count += 1
         
-        logger.info(f"User {user_id} connected. Total connections: {len(self.active_connections[user_id])}")
+        logger.info(f"User {user_id} connected. Total connections: {len(connections)}")
         
         # Send connection acknowledgment
         await self.send_personal_message(
@@ -52,6 +103,8 @@ class ConnectionManager:
             },
             websocket
         )
+        
+        return True
     
     def disconnect(self, websocket: WebSocket):
         """
@@ -60,56 +113,163 @@ class ConnectionManager:
         Args:
             websocket: WebSocket connection
         """
-        user_id = self.connection_users.get(websocket)
+        user_id = getattr(websocket.state, "user_id", None)
+        connections = self.active_connections.get(user_id)
         
-        if user_id and user_id in self.active_connections:
-            self.active_connections[user_id].discard(websocket)
-            
-            # Remove user entry if no more connections
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-            
-            logger.info(f"User {user_id} disconnected")
+        # Disconnect can run more than once for the same socket (eviction, send failure, endpoint exit)
+        if connections is None or websocket not in connections:
+            return
+        
+        del connections[websocket]
+        self.connection_count -= 1
+        
+        # Remove user entry if no more connections (is_user_online relies on this)
+        if not connections:
+            del self.active_connections[user_id]
         
-        if websocket in self.connection_users:
-            del self.connection_users[websocket]
+        logger.info(f"User {user_id} disconnected")
     
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
+    async def send_personal_message(self, message: Union[dict, str], websocket: WebSocket):
         """
         Send message to a specific WebSocket connection
         
         Args:
-            message: Message dict to send
+            message: Message dict, or a payload already built with encode_message
             websocket: Target WebSocket
         """
         try:
-            await websocket.send_json(message)
+            await websocket.send_text(message if isinstance(message, str) else encode_message(message))
         except Exception as e:
             logger.error(f"Error sending message: {e}")
     
-    async def send_to_user(self, message: dict, user_id: str):
+    async def broadcast(self, message: Union[dict, str], websockets: List[WebSocket]):
         """
-        Send message to all connections of a user (multi-device)
+        Send the same message to many WebSocket connections concurrently
         
         Args:
-            message: Message dict to send
-            user_id: Target user ID
+            message: Message dict, or a payload already built with encode_message
+            websockets: Target connections (a snapshot; the registry can change while sends are in flight)
         """
-        if user_id in self.active_connections:
-            disconnected = set()
-            
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error sending to user {user_id}: {e}")
-                    disconnected.add(connection)
+        if not websockets:
+            return
+        
+        text = message if isinstance(message, str) else encode_message(message)
+        disconnected = []
+        
+        # Send concurrently so one slow device doesn't hold up the others
+        for i in range(0, len(websockets), SEND_BATCH_SIZE):
+            batch = websockets[i:i + SEND_BATCH_SIZE]
+            results = await asyncio.gather(
+                *[connection.send_text(text) for connection in batch],
+                return_exceptions=True
+            )
+            for connection, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error sending to user {getattr(connection.state, 'user_id', None)}: {result}")
+                    disconnected.append(connection)
             
-            # Clean up disconnected connections
-            for connection in disconnected:
-                self.disconnect(connection)
+            if i + SEND_BATCH_SIZE < len(websockets):
+                await asyncio.sleep(0)
+        
+        # Clean up disconnected connections
+        for connection in disconnected:
+            self.disconnect(connection)
     
-    async def broadcast_to_conversation(self, message: dict, conversation_id: str, participant_ids: list, exclude_user: Optional[str] = None):
+    async def send_to_user(self, message: Union[dict, str], user_id: str):
+        """
+        Send message to all connections of a user (multi-device), on any worker
+        
+        Args:
+            message: Message dict, or a payload already built with encode_message
+            user_id: Target user ID
+        """
+        await self.send_to_users(message, [user_id])
+    
+    async def send_to_users(self, message: Union[dict, str], user_ids: Iterable[str]):
+        """
+        Send the same message to many users concurrently, on any worker
+        
+        Args:
+            message: Message dict, or a payload already built with encode_message
+            user_ids: Target user IDs
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        
+        text = message if isinstance(message, str) else encode_message(message)
+        
+        if self._listener_task is None:
+            # No subscription (single process or Redis not started): deliver locally
+            await self.send_to_local_users(text, user_ids)
+            return
+        
+        # One publish per broadcast; every worker (this one included) delivers to its own sockets
+        try:
+            redis = await get_redis()
+            await redis.publish(WS_DELIVERY_CHANNEL, ",".join(user_ids) + "\n" + text)
+        except Exception as e:
+            # Broadcasts never fail the caller; reach this worker's sockets at least
+            logger.error(f"WebSocket delivery publish failed, delivering locally: {e}")
+            await self.send_to_local_users(text, user_ids)
+    
+    async def send_to_local_users(self, message: Union[dict, str], user_ids: Iterable[str]):
+        """
+        Send a message to the given users' connections on this worker only
+        
+        Args:
+            message: Message dict, or a payload already built with encode_message
+            user_ids: Target user IDs
+        """
+        # One flat list of every device of every target user connected to this process
+        await self.broadcast(
+            message,
+            [
+                connection
+                for user_id in user_ids
+                for connection in self.active_connections.get(user_id, ())
+            ]
+        )
+    
+    async def start_pubsub(self):
+        """Subscribe to cross-worker deliveries (call once per worker after Redis connects)"""
+        self._listener_task = asyncio.create_task(self._listen())
+        logger.info("WebSocket delivery subscription started")
+    
+    async def stop_pubsub(self):
+        """Stop the cross-worker delivery subscription"""
+        if self._listener_task is None:
+            return
+        
+        self._listener_task.cancel()
+        try:
+            await self._listener_task
+        except asyncio.CancelledError:
+            pass
+        self._listener_task = None
+    
+    async def _listen(self):
+        """Route published deliveries to this worker's sockets, resubscribing after errors"""
+        while True:
+            try:
+                redis = await get_redis()
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(WS_DELIVERY_CHANNEL)
+                    async for delivery in pubsub.listen():
+                        if delivery["type"] != "message":
+                            continue
+                        header, _, text = delivery["data"].partition("\n")
+                        # Each delivery runs on its own so a slow socket only delays its own message
+                        task = asyncio.create_task(self.send_to_local_users(text, header.split(",")))
+                        self._delivery_tasks.add(task)
+                        task.add_done_callback(self._delivery_tasks.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket delivery subscription failed: {e}")
+                await asyncio.sleep(1)
+    
+    async def broadcast_to_conversation(self, message: Union[dict, str], conversation_id: str, participant_ids: list, exclude_user: Optional[str] = None):
         """
         Broadcast message to all participants in a conversation
         
@@ -119,21 +279,23 @@ class ConnectionManager:
             participant_ids: List of participant user IDs
             exclude_user: Optional user ID to exclude from broadcast
         """
-        for user_id in participant_ids:
-            if user_id != exclude_user:
-                await self.send_to_user(message, user_id)
+        await self.send_to_users(
+            message,
+            [user_id for user_id in participant_ids if user_id != exclude_user]
+        )
     
     def is_user_online(self, user_id: str) -> bool:
         """
-        Check if user is online
+        Check if user is connected to this worker
         
         Args:
             user_id: User ID to check
             
         Returns:
-            True if user has active connections
+            True if user has active connections here (presence across workers is counted in Redis)
         """
-        return user_id in self.active_connections and len(self.active_connections[user_id]) > 0
+        # disconnect() deletes a user's entry with their last connection
+        return user_id in self.active_connections
     
     def get_online_users(self) -> Set[str]:
         """
@@ -154,7 +316,7 @@ class ConnectionManager:
         Returns:
             Number of active connections
         """
-        return len(self.active_connections.get(user_id, set()))
+        return len(self.active_connections.get(user_id, ()))
 
 
 # Global connection manager instance
@@ -5,27 +5,38 @@ Main FastAPI application
 
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 from datetime import datetime
 
 from app.core import settings, connect_to_mongo, close_mongo_connection, connect_to_redis, close_redis_connection
 from app.core.rate_limit import init_app as init_rate_limiter
-from app.core.logging import logger
+from app.core.websocket import manager
+from app.services.message_write_buffer import message_write_buffer
+from app.services.message_status_buffer import message_status_buffer
+from app.services.presence_service import presence_flusher
+from app.services.email_otp_service import email_otp_service
+from app.services.otp_service import otp_service
+from app.core.logging import logger, log_listener
 from app.core.exceptions import http_exception_handler, validation_exception_handler, global_exception_handler
 from app.api.v1 import api_router
 
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException
-from fastapi import Request
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
+    log_listener.start()
     logger.info("Starting HABIBTI API...")
-    await connect_to_mongo()
-    await connect_to_redis()
+    await asyncio.gather(connect_to_mongo(), connect_to_redis())
+    await manager.start_pubsub()
+    await message_write_buffer.start()
+    await message_status_buffer.start()
+    await presence_flusher.start()
     
     # Initialize Rate Limiter
     init_rate_limiter(app)
@@ -36,9 +47,17 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down HABIBTI API...")
-    await close_mongo_connection()
-    await close_redis_connection()
+    await message_write_buffer.stop()
+    await message_status_buffer.stop()
+    await presence_flusher.stop()
+    await manager.stop_pubsub()
+    await email_otp_service.close()
+    await otp_service.close()
+    await asyncio.gather(close_mongo_connection(), close_redis_connection())
     logger.info("HABIBTI API shut down successfully")
+    
+    # Flushes the remaining queued records
+    log_listener.stop()
 
 
 # Create FastAPI application
@@ -48,6 +67,8 @@ app = FastAPI(
     version="0.1.0",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    openapi_url="/openapi.json" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -56,20 +77,21 @@ app.add_exception_handler(HTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, global_exception_handler)
 
-from app.core.middleware import SecurityHeadersMiddleware
+from app.core.middleware import SecurityHeadersMiddleware, AccessLogMiddleware
 
-# Request Logging Middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log incoming requests and responses"""
-    logger.info(f"Request: {request.method} {request.url}")
-    
-    response = await call_next(request)
-    
-    logger.info(f"Response: {response.status_code}")
-    return response
+# Configure CORS (added first, so it runs innermost)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=settings.cors_origins_set,
+    allow_origin_regex=r"https://.*\.netlify\.app",  # Allow Netlify deployments
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
+)
 
-# Add Middleware
+# Add Middleware (last added wraps outermost: security headers also cover CORS responses)
+app.add_middleware(AccessLogMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 
 
@@ -77,15 +99,6 @@ app.add_middleware(SecurityHeadersMiddleware)
 
 
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.cors_origins_list,
-    allow_origin_regex=r"https://.*\.netlify\.app",  # Allow Netlify deployments
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
@@ -113,12 +126,19 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
     
+    # One event loop per core: WebSocket delivery (pub/sub), presence and per-user
+    # connection counts live in Redis. (reload only works with one worker.)
     uvicorn.run(
         "app.main:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
         reload=settings.DEBUG,
+        loop="uvloop",
+        http="httptools",
+        workers=1 if settings.DEBUG else (os.cpu_count() or 1),
+        access_log=False,  # AccessLogMiddleware already logs each request
         log_level=settings.LOG_LEVEL.lower()
     )
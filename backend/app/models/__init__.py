@@ -9,7 +9,9 @@ from app.models.user import (
     UserProfile,
     UserPrivacy,
     DeviceInfo,
+    DocumentModel,
     PyObjectId,
+    ObjectIdStr,
     Gender,
     AuthResponse,
     PasswordLoginRequest
@@ -34,7 +36,9 @@ from app.models.message import (
     MessageListResponse,
     MessageStatusUpdate,
     MessageDelete,
-    RecipientKey
+    RecipientKey,
+    RecipientKeyEntry,
+    MediaType
 )
 from app.models.friendship import (
     Friendship,
@@ -63,7 +67,9 @@ __all__ = [
     "UserProfile",
     "UserPrivacy",
     "DeviceInfo",
+    "DocumentModel",
     "PyObjectId",
+    "ObjectIdStr",
     "Gender",
     "AuthResponse",
     "PasswordLoginRequest",
@@ -83,6 +89,8 @@ __all__ = [
     "MessageStatusUpdate",
     "MessageDelete",
     "RecipientKey",
+    "RecipientKeyEntry",
+    "MediaType",
     "Friendship",
     "FriendRequestCreate",
     "FriendRequestRespond",
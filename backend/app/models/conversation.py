@@ -4,17 +4,19 @@ Conversation model and schemas
 
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime, timezone
-from bson import ObjectId
-from app.models.user import PyObjectId
+from typing_extensions import TypedDict
+from datetime import datetime
+from app.models.user import DocumentModel, PyObjectId, ObjectIdStr, utc_now
 
 
 class ConversationParticipant(BaseModel):
     """Participant in a conversation"""
     user_id: str
-    joined_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    joined_at: datetime = Field(default_factory=utc_now)
     left_at: Optional[datetime] = None
     last_read_at: Optional[datetime] = None
+    unread_count: int = 0  # Denormalized, maintained on send/read
+    has_deletions: bool = False  # Set on first delete-for-me, lets reads skip the deleted_for filter
     notifications_enabled: bool = True
 
 
@@ -28,33 +30,29 @@ class LastMessage(BaseModel):
 
 class ConversationMetadata(BaseModel):
     """Conversation metadata"""
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
     archived_by: List[str] = Field(default_factory=list)  # User IDs who archived
 
 
-class Conversation(BaseModel):
+class Conversation(DocumentModel):
     """Conversation model"""
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
     type: str = Field(default="one_to_one", pattern=r'^(one_to_one|group)$')
     
     participants: List[ConversationParticipant]
     participant_ids: List[str]  # Sorted array for quick lookup
+    pair_key: Optional[str] = None  # "<lower id>:<higher id>", unique per one-to-one chat
     
     last_message: Optional[LastMessage] = None
     metadata: ConversationMetadata = Field(default_factory=ConversationMetadata)
-    
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
 
 
 # Request/Response Schemas
 
 class ConversationCreate(BaseModel):
     """Create or get conversation"""
-    participant_id: str  # Other user's ID
+    participant_id: ObjectIdStr  # Other user's ID
     
     class Config:
         json_schema_extra = {
@@ -64,18 +62,37 @@ class ConversationCreate(BaseModel):
         }
 
 
+class ParticipantView(TypedDict):
+    """Other participant's user card (see user_cache_service.build_user_card)"""
+    user_id: str
+    username: str
+    full_name: str
+    avatar_url: Optional[str]
+    last_seen: Optional[str]
+    public_key: Optional[str]
+    online: bool
+
+
+class LastMessageView(TypedDict):
+    """Last message preview as stored on the conversation"""
+    message_id: str
+    encrypted_preview: str
+    timestamp: datetime
+    sender_id: str
+
+
 class ConversationResponse(BaseModel):
     """Conversation response"""
     id: str
     type: str
-    participants: List[dict]  # User info for each participant
-    last_message: Optional[dict]
+    participants: List[ParticipantView]  # User info for each participant
+    last_message: Optional[LastMessageView]
     unread_count: int = 0
     created_at: datetime
     updated_at: datetime
     
     class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
+        frozen = True
         json_schema_extra = {
             "example": {
                 "id": "507f1f77bcf86cd799439011",
@@ -4,9 +4,8 @@ Friendship model and schemas
 
 from pydantic import BaseModel, Field
 from typing import Optional
-from datetime import datetime, timezone
-from bson import ObjectId
-from app.models.user import PyObjectId
+from datetime import datetime
+from app.models.user import DocumentModel, PyObjectId, ObjectIdStr, utc_now
 from enum import Enum
 
 
@@ -18,33 +17,29 @@ class FriendshipStatus(str, Enum):
     BLOCKED = "blocked"
 
 
-class Friendship(BaseModel):
+class Friendship(DocumentModel):
     """Friendship model"""
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
     requester_id: str  # User who sent the request
     addressee_id: str  # User who receives the request
+    pair_key: Optional[str] = None  # "<lower id>:<higher id>", unique per pair of users
     
     status: FriendshipStatus = FriendshipStatus.PENDING
     
     # Timestamps
-    requested_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    requested_at: datetime = Field(default_factory=utc_now)
     responded_at: Optional[datetime] = None
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=utc_now)
     
     # For blocking
     blocked_by: Optional[str] = None  # User ID who blocked
-    
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
 
 
 # Request/Response Schemas
 
 class FriendRequestCreate(BaseModel):
     """Send a friend request"""
-    user_id: str  # User to send request to
+    user_id: ObjectIdStr  # User to send request to
     
     class Config:
         json_schema_extra = {
@@ -69,13 +64,12 @@ class FriendRequestRespond(BaseModel):
 class FriendshipResponse(BaseModel):
     """Friendship response with user details"""
     id: str
-    user: dict  # User details (requester or addressee depending on context)
+    user: Optional[dict] = None  # User details (requester or addressee depending on context)
     status: str
     requested_at: datetime
     responded_at: Optional[datetime]
     
     class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
         json_schema_extra = {
             "example": {
                 "id": "507f1f77bcf86cd799439011",
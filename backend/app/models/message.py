@@ -3,10 +3,21 @@ Message model and schemas
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import datetime, timezone
-from bson import ObjectId
-from app.models.user import PyObjectId
+from typing import Optional, List, Literal
+from typing_extensions import TypedDict
+from datetime import datetime
+from app.models.user import DocumentModel, PyObjectId, utc_now
+from enum import Enum
+
+
+class MediaType(str, Enum):
+    """Uploadable chat media type"""
+    IMAGE = "image"
+    VIDEO = "video"
+
+
+# Message content types (a Literal validates as a set lookup, no regex)
+ContentType = Literal["text", "image", "video", "audio", "file"]
 
 
 class RecipientKey(BaseModel):
@@ -16,6 +27,13 @@ class RecipientKey(BaseModel):
     encrypted_key: str  # Symmetric key encrypted with device public key
 
 
+class RecipientKeyEntry(TypedDict):
+    """Recipient key as validated on send (a plain dict, stored as-is)"""
+    user_id: str
+    device_id: str
+    encrypted_key: str
+
+
 class MessageMetadata(BaseModel):
     """Message metadata (NOT encrypted)"""
     media_url: Optional[str] = None
@@ -27,7 +45,7 @@ class MessageMetadata(BaseModel):
     # Ephemeral settings
     is_ephemeral: bool = False
     ttl_seconds: Optional[int] = None  # Time to live
-    expires_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # Deletion time, enforced by a TTL index
     view_once: bool = False
     viewed_by: List[dict] = Field(default_factory=list)  # [{user_id, viewed_at}]
 
@@ -46,12 +64,12 @@ class ReadStatus(BaseModel):
 
 class MessageStatus(BaseModel):
     """Message status tracking"""
-    sent_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    sent_at: datetime = Field(default_factory=utc_now)
     delivered_to: List[DeliveryStatus] = Field(default_factory=list)
     read_by: List[ReadStatus] = Field(default_factory=list)
 
 
-class Message(BaseModel):
+class Message(DocumentModel):
     """Message model"""
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
     conversation_id: str
@@ -60,7 +78,7 @@ class Message(BaseModel):
     # Content - supports both plaintext and encrypted
     content: str = ""  # Plaintext content (empty if encrypted)
     encrypted_content: str = ""  # Encrypted content (empty if plaintext)
-    content_type: str = Field(..., pattern=r'^(text|image|video|audio|file)$')
+    content_type: ContentType
     
     # Per-recipient encryption (optional for multi-device)
     recipient_keys: List[RecipientKey] = Field(default_factory=list)
@@ -76,12 +94,7 @@ class Message(BaseModel):
     deleted_for_everyone: bool = False
     deleted_at: Optional[datetime] = None
     
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
+    created_at: datetime = Field(default_factory=utc_now)
 
 
 # Request/Response Schemas
@@ -91,8 +104,9 @@ class MessageCreate(BaseModel):
     conversation_id: str
     content: str = ""  # Plaintext content
     encrypted_content: str = ""  # Encrypted content
-    content_type: str = Field(..., pattern=r'^(text|image|video|audio|file)$')
-    recipient_keys: List[RecipientKey] = Field(default_factory=list)
+    content_type: ContentType
+    recipient_keys: List[RecipientKeyEntry] = Field(default_factory=list)
+    preview: Optional[str] = Field(None, max_length=50)  # Conversation list preview (defaults to first 50 chars)
     
     # Optional metadata
     media_url: Optional[str] = None
@@ -130,7 +144,7 @@ class MessageResponse(BaseModel):
     sender_id: str
     encrypted_content: str
     content_type: str
-    recipient_keys: List[dict]
+    recipient_keys: List[RecipientKeyEntry]
     metadata: dict
     status: dict
     created_at: datetime
@@ -139,7 +153,7 @@ class MessageResponse(BaseModel):
     is_deleted: bool = False
     
     class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
+        frozen = True
         json_schema_extra = {
             "example": {
                 "id": "507f1f77bcf86cd799439011",
@@ -164,7 +178,7 @@ class MessageListResponse(BaseModel):
     """List of messages"""
     messages: List[MessageResponse]
     has_more: bool
-    total: int
+    total: Optional[int] = None  # Only computed for the first page
     
     class Config:
         json_schema_extra = {
@@ -179,7 +193,7 @@ class MessageListResponse(BaseModel):
 class MessageStatusUpdate(BaseModel):
     """Update message status"""
     message_id: str
-    status: str = Field(..., pattern=r'^(delivered|read)$')
+    status: Literal["delivered", "read"]
     
     class Config:
         json_schema_extra = {
@@ -2,13 +2,16 @@
 Moment model and schemas (24-hour stories/feeds)
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List
-from datetime import datetime, timedelta, timezone
-from bson import ObjectId
-from app.models.user import PyObjectId
+from typing_extensions import TypedDict
+from datetime import datetime, timedelta
+from app.models.user import DocumentModel, PyObjectId, utc_now
 from enum import Enum
 
+# Moments expire this long after creation
+MOMENT_LIFETIME = timedelta(hours=24)
+
 
 class MomentType(str, Enum):
     """Moment content type"""
@@ -20,10 +23,10 @@ class MomentType(str, Enum):
 class MomentView(BaseModel):
     """Moment view tracking"""
     user_id: str
-    viewed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    viewed_at: datetime = Field(default_factory=utc_now)
 
 
-class Moment(BaseModel):
+class Moment(DocumentModel):
     """Moment model (24-hour story)"""
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
     user_id: str  # Creator
@@ -43,22 +46,23 @@ class Moment(BaseModel):
     view_count: int = 0
     
     # Timestamps
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
     expires_at: datetime  # Auto-calculated as created_at + 24 hours
     
     # Soft delete
     deleted: bool = False
     deleted_at: Optional[datetime] = None
     
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
-    
-    def __init__(self, **data):
-        if 'expires_at' not in data:
-            data['expires_at'] = datetime.now(timezone.utc) + timedelta(hours=24)
-        super().__init__(**data)
+    @model_validator(mode="before")
+    @classmethod
+    def default_expires_at(cls, data):
+        """Fill expires_at from created_at when it isn't given"""
+        if isinstance(data, dict) and "expires_at" not in data:
+            data = dict(data)
+            created_at = data.setdefault("created_at", utc_now())
+            if isinstance(created_at, datetime):
+                data["expires_at"] = created_at + MOMENT_LIFETIME
+        return data
 
 
 # Request/Response Schemas
@@ -83,10 +87,18 @@ class MomentCreate(BaseModel):
         }
 
 
+class MomentAuthor(TypedDict):
+    """Moment creator's public details"""
+    id: str
+    username: str
+    full_name: str
+    avatar_url: Optional[str]
+
+
 class MomentResponse(BaseModel):
     """Moment response"""
     id: str
-    user: dict  # User details
+    user: MomentAuthor  # User details
     type: str
     text_content: Optional[str]
     media_url: Optional[str]
@@ -99,7 +111,7 @@ class MomentResponse(BaseModel):
     time_remaining: int  # Seconds until expiry
     
     class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
+        frozen = True
         json_schema_extra = {
             "example": {
                 "id": "507f1f77bcf86cd799439011",
@@ -3,20 +3,19 @@ OTP Session model and schemas
 """
 
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
-from datetime import datetime, timezone
-from bson import ObjectId
-from app.models.user import PyObjectId
+from typing import Optional, Literal
+from datetime import datetime
+from app.models.user import DocumentModel, PyObjectId, ObjectIdStr, utc_now
 
 
 class OTPMetadata(BaseModel):
     """OTP session metadata"""
     ip_address: Optional[str] = None
     user_agent: Optional[str] = None
-    purpose: str = Field(..., pattern=r'^(signup|login|recovery)$')
+    purpose: Literal["signup", "login", "recovery"]
 
 
-class OTPSession(BaseModel):
+class OTPSession(DocumentModel):
     """OTP session model"""
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
     identifier: str  # Email address
@@ -25,18 +24,13 @@ class OTPSession(BaseModel):
     attempts: int = 0
     max_attempts: int = 3
     
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
     expires_at: datetime
     verified: bool = False
     verified_at: Optional[datetime] = None
     
     session_token: Optional[str] = None  # Temp token after verification
     metadata: OTPMetadata
-    
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
 
 
 # Request/Response Schemas
@@ -44,7 +38,7 @@ class OTPSession(BaseModel):
 class OTPRequest(BaseModel):
     """Request to send OTP"""
     email: EmailStr = Field(..., description="Email address to send OTP")
-    purpose: str = Field(..., pattern=r'^(signup|login|recovery)$')
+    purpose: Literal["signup", "login", "recovery"]
     
     class Config:
         json_schema_extra = {
@@ -57,7 +51,7 @@ class OTPRequest(BaseModel):
 
 class OTPVerifyRequest(BaseModel):
     """Request to verify OTP"""
-    session_id: str
+    session_id: ObjectIdStr
     otp: str = Field(..., min_length=6, max_length=6)
     
     class Config:
@@ -2,19 +2,60 @@
 User model and schemas
 """
 
-from pydantic import BaseModel, Field, EmailStr, field_validator, BeforeValidator
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, AfterValidator, BeforeValidator
+from typing import Annotated, Optional, List
 from datetime import datetime, date, timezone
-from bson import ObjectId
 from enum import Enum
-
-
-from typing import Annotated, Any
-from pydantic import BaseModel, Field, EmailStr, field_validator, BeforeValidator
+from functools import partial
+import re
 
 # Pydantic v2 compatible ObjectId
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
+# ObjectId hex string from client input; rejected by validation before any handler/DB work
+ObjectIdStr = Annotated[str, Field(pattern=r'^[0-9a-fA-F]{24}$')]
+
+# Letters (any script) and whitespace, matched in one C-level scan
+FULL_NAME_PATTERN = re.compile(r"(?:[^\W\d_]|\s)*")
+
+# Timezone-aware "now" for timestamp default_factory (no wrapping lambda frame)
+utc_now = partial(datetime.now, timezone.utc)
+
+
+def age_in_years(born: date, today: date) -> int:
+    """Completed years between two dates (dates as YYYYMMDD integers, no tuple compare)"""
+    return (
+        (today.year * 10000 + today.month * 100 + today.day)
+        - (born.year * 10000 + born.month * 100 + born.day)
+    ) // 10000
+
+
+def validate_full_name(v: str) -> str:
+    """Validate full name contains only alphabets and spaces"""
+    if not FULL_NAME_PATTERN.fullmatch(v):
+        raise ValueError("Full name must contain only alphabets and spaces")
+    return v.strip()
+
+
+def validate_age(v: date) -> date:
+    """Validate minimum age (13 years)"""
+    age = age_in_years(v, date.today())
+    if age < 13:
+        raise ValueError("User must be at least 13 years old")
+    if age > 120:
+        raise ValueError("Invalid date of birth")
+    return v
+
+
+# Shared by UserProfile and UserCreate
+FullName = Annotated[str, Field(min_length=2, max_length=100), AfterValidator(validate_full_name)]
+BirthDate = Annotated[date, AfterValidator(validate_age)]
+
+
+class DocumentModel(BaseModel):
+    """Base for models mirroring a MongoDB document (populated from "_id" or "id")"""
+    model_config = ConfigDict(populate_by_name=True)
+
 
 class Gender(str, Enum):
     """Gender enumeration"""
@@ -26,37 +67,17 @@ class Gender(str, Enum):
 
 class UserProfile(BaseModel):
     """User profile information"""
-    full_name: str = Field(..., min_length=2, max_length=100, description="Full name (alphabets only)")
+    full_name: FullName = Field(..., description="Full name (alphabets only)")
     bio: Optional[str] = Field(None, max_length=500)
     avatar_url: Optional[str] = None
     
     # Mandatory fields for signup
     mobile: str = Field(..., pattern=r'^\+?[1-9]\d{9,14}$', description="Mobile number (unique, no OTP)")
     address: str = Field(..., min_length=10, max_length=500, description="Full address")
-    date_of_birth: date = Field(..., description="Date of birth (age validation required)")
+    date_of_birth: BirthDate = Field(..., description="Date of birth (age validation required)")
     gender: Gender = Field(..., description="Gender")
     
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    
-    @field_validator('full_name')
-    @classmethod
-    def validate_full_name(cls, v):
-        """Validate full name contains only alphabets and spaces"""
-        if not all(c.isalpha() or c.isspace() for c in v):
-            raise ValueError("Full name must contain only alphabets and spaces")
-        return v.strip()
-    
-    @field_validator('date_of_birth')
-    @classmethod
-    def validate_age(cls, v):
-        """Validate minimum age (13 years)"""
-        today = date.today()
-        age = today.year - v.year - ((today.month, today.day) < (v.month, v.day))
-        if age < 13:
-            raise ValueError("User must be at least 13 years old")
-        if age > 120:
-            raise ValueError("Invalid date of birth")
-        return v
+    created_at: datetime = Field(default_factory=utc_now)
 
 
 class UserPrivacy(BaseModel):
@@ -78,14 +99,14 @@ class DeviceInfo(BaseModel):
     device_id: str
     device_name: str
     public_key: str
-    last_active: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_active: datetime = Field(default_factory=utc_now)
     push_token: Optional[str] = None
 
 
 class UserStatus(BaseModel):
     """User online status"""
     online: bool = False
-    last_seen: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_seen: datetime = Field(default_factory=utc_now)
 
 
 class UserMetadata(BaseModel):
@@ -93,11 +114,11 @@ class UserMetadata(BaseModel):
     trust_score: int = Field(default=100, ge=0, le=100)
     is_banned: bool = False
     account_status: str = Field(default="active", pattern=r'^(active|suspended|deleted)$')
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
 
 
-class User(BaseModel):
+class User(DocumentModel):
     """Complete user model"""
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
     email: EmailStr = Field(..., description="Primary identifier (unique)")
@@ -115,9 +136,6 @@ class User(BaseModel):
     hashed_password: Optional[str] = None
     
     class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str, date: lambda v: v.isoformat()}
         json_schema_extra = {
             "example": {
                 "email": "salman@example.com",
@@ -146,10 +164,10 @@ class UserCreate(BaseModel):
     password: str = Field(..., min_length=8, description="Password for login")
     
     # Mandatory profile fields
-    full_name: str = Field(..., min_length=2, max_length=100)
+    full_name: FullName
     mobile: str = Field(..., pattern=r'^\+?[1-9]\d{9,14}$')
     address: str = Field(..., min_length=10, max_length=500)
-    date_of_birth: date
+    date_of_birth: BirthDate
     gender: Gender
     
     # Optional
@@ -158,24 +176,6 @@ class UserCreate(BaseModel):
     # Encryption
     public_key: str
     device_info: DeviceInfo
-    
-    @field_validator('full_name')
-    @classmethod
-    def validate_full_name(cls, v):
-        if not all(c.isalpha() or c.isspace() for c in v):
-            raise ValueError("Full name must contain only alphabets and spaces")
-        return v.strip()
-    
-    @field_validator('date_of_birth')
-    @classmethod
-    def validate_age(cls, v):
-        today = date.today()
-        age = today.year - v.year - ((today.month, today.day) < (v.month, v.day))
-        if age < 13:
-            raise ValueError("User must be at least 13 years old")
-        if age > 120:
-            raise ValueError("Invalid date of birth")
-        return v
 
 
 class UserUpdate(BaseModel):
@@ -195,6 +195,18 @@ class UserResponse(BaseModel):
     avatar_url: Optional[str]
     bio: Optional[str]
     
+    @classmethod
+    def from_db(cls, user: dict) -> "UserResponse":
+        """Build from a users document (trusted, so built without validation)"""
+        profile = user["profile"]
+        return cls.model_construct(
+            id=str(user["_id"]),
+            username=user["username"],
+            full_name=profile["full_name"],
+            avatar_url=profile.get("avatar_url"),
+            bio=profile.get("bio")
+        )
+    
     class Config:
         json_schema_extra = {
             "example": {
@@ -218,7 +230,6 @@ class UserDetailResponse(BaseModel):
     status: UserStatus
     
     class Config:
-        json_encoders = {date: lambda v: v.isoformat()}
         json_schema_extra = {
             "example": {
                 "id": "507f1f77bcf86cd799439011",
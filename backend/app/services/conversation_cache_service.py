@@ -0,0 +1,52 @@
+"""
+Conversation Participants Cache
+Cache-aside Redis set of each conversation's participant IDs (read by WebSocket typing events)
+"""
+
+from typing import Set
+from bson import ObjectId
+from app.core.redis import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_PARTICIPANTS_PREFIX = "conv:participants:"
+CONVERSATION_PARTICIPANTS_TTL_SECONDS = 300
+
+
+async def get_conversation_participants(conversation_id: str, db) -> Set[str]:
+    """
+    Get a conversation's participant IDs, reading through to MongoDB on a miss
+
+    Args:
+        conversation_id: Conversation ID
+        db: Database instance
+
+    Returns:
+        Participant user IDs (empty if the conversation does not exist)
+    """
+    if not ObjectId.is_valid(conversation_id):
+        return set()
+
+    redis = await get_redis()
+    key = CONVERSATION_PARTICIPANTS_PREFIX + conversation_id
+
+    participant_ids = await redis.smembers(key)
+    if participant_ids:
+        return participant_ids
+
+    conversation = await db.conversations.find_one(
+        {"_id": ObjectId(conversation_id)},
+        {"participant_ids": 1}
+    )
+    if not conversation:
+        return set()
+
+    participant_ids = set(conversation["participant_ids"])
+
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.sadd(key, *participant_ids)
+        pipe.expire(key, CONVERSATION_PARTICIPANTS_TTL_SECONDS)
+        await pipe.execute()
+
+    return participant_ids
@@ -3,55 +3,24 @@ Email OTP Service
 Handles sending OTP via email
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from typing import Optional
+from email.message import EmailMessage
 from app.core.config import settings
+import aiosmtplib
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Email subject based on purpose
+OTP_EMAIL_SUBJECTS = {
+    "signup": "Welcome to HABIBTI - Verify Your Email",
+    "login": "HABIBTI Login Verification Code",
+    "recovery": "HABIBTI Account Recovery Code"
+}
 
-class EmailOTPService:
-    """Email OTP sending service"""
-    
-    def __init__(self):
-        # Email configuration (can be configured via environment variables)
-        self.smtp_host = getattr(settings, 'SMTP_HOST', 'smtp.gmail.com')
-        self.smtp_port = getattr(settings, 'SMTP_PORT', 587)
-        self.smtp_user = getattr(settings, 'SMTP_USER', '')
-        self.smtp_password = getattr(settings, 'SMTP_PASSWORD', '')
-        self.from_email = getattr(settings, 'FROM_EMAIL', 'noreply@habibti.app')
-        self.from_name = getattr(settings, 'FROM_NAME', 'HABIBTI')
-        
-        if not self.smtp_user or not self.smtp_password:
-            logger.warning("SMTP not configured. OTP will be logged instead of sent.")
-            self.smtp_configured = False
-        else:
-            self.smtp_configured = True
-    
-    async def send_email(self, to: str, otp: str, purpose: str = "signup") -> bool:
-        """
-        Send OTP via email
-        
-        Args:
-            to: Email address
-            otp: OTP code to send
-            purpose: Purpose of OTP (signup, login, recovery)
-            
-        Returns:
-            True if sent successfully
-        """
-        # Email subject based on purpose
-        subjects = {
-            "signup": "Welcome to HABIBTI - Verify Your Email",
-            "login": "HABIBTI Login Verification Code",
-            "recovery": "HABIBTI Account Recovery Code"
-        }
-        subject = subjects.get(purpose, "HABIBTI Verification Code")
-        
-        # HTML email body
-        html_body = f"""
+# HTML email body (str.format_map fields: otp, expiry)
+OTP_EMAIL_HTML_TEMPLATE = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -119,7 +88,7 @@ class EmailOTPService:
                         {otp}
                     </div>
                     
-                    <p><strong>This code will expire in {settings.OTP_EXPIRY_MINUTES} minutes.</strong></p>
+                    <p><strong>This code will expire in {expiry} minutes.</strong></p>
                     
                     <div class="warning">
                         <strong>⚠️ Security Notice:</strong><br>
@@ -136,39 +105,115 @@ class EmailOTPService:
         </body>
         </html>
         """
-        
-        # Plain text fallback
-        text_body = f"""
+
+# Plain text fallback
+OTP_EMAIL_TEXT_TEMPLATE = """
         HABIBTI - Verification Code
         
         Your verification code is: {otp}
         
-        This code will expire in {settings.OTP_EXPIRY_MINUTES} minutes.
+        This code will expire in {expiry} minutes.
         
         If you didn't request this code, please ignore this email.
         
         © 2026 HABIBTI - Privacy-First Chat Application
         """
+
+
+class EmailOTPService:
+    """Email OTP sending service"""
+    
+    def __init__(self):
+        # Email configuration (environment variables; defaults live in Settings)
+        self.smtp_host = settings.SMTP_HOST
+        self.smtp_port = settings.SMTP_PORT
+        self.smtp_user = settings.SMTP_USER
+        self.smtp_password = settings.SMTP_PASSWORD
+        self.from_email = settings.FROM_EMAIL
+        self.from_name = settings.FROM_NAME
+        self.from_header = f"{self.from_name} <{self.from_email}>"
+        
+        if not self.smtp_user or not self.smtp_password:
+            logger.warning("SMTP not configured. OTP will be logged instead of sent.")
+            self.smtp_configured = False
+        else:
+            self.smtp_configured = True
+        
+        # One authenticated connection reused across sends (opened on first use)
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._smtp_lock = asyncio.Lock()
+    
+    async def _connect(self) -> aiosmtplib.SMTP:
+        """Open, STARTTLS and log in to the SMTP server"""
+        smtp = aiosmtplib.SMTP(hostname=self.smtp_host, port=self.smtp_port, start_tls=True)
+        await smtp.connect()
+        try:
+            await smtp.login(self.smtp_user, self.smtp_password)
+        except aiosmtplib.SMTPException:
+            smtp.close()
+            raise
+        return smtp
+    
+    async def _deliver(self, message: EmailMessage):
+        """
+        Send over the shared connection, reconnecting once if the server dropped it
+        
+        Sends are serialized on the lock: an SMTP session carries one transaction at a time.
+        """
+        async with self._smtp_lock:
+            for attempt in range(2):
+                if self._smtp is None or not self._smtp.is_connected:
+                    self._smtp = await self._connect()
+                try:
+                    await self._smtp.send_message(message)
+                    return
+                except aiosmtplib.SMTPServerDisconnected:
+                    # Idle connections get closed server-side; retry once on a fresh one
+                    self._smtp = None
+                    if attempt:
+                        raise
+    
+    async def close(self):
+        """Close the shared SMTP connection"""
+        async with self._smtp_lock:
+            if self._smtp is not None and self._smtp.is_connected:
+                try:
+                    await self._smtp.quit()
+                except aiosmtplib.SMTPException:
+                    self._smtp.close()
+            self._smtp = None
+    
+    async def send_email(self, to: str, otp: str, purpose: str = "signup") -> bool:
+        """
+        Send OTP via email
+        
+        Args:
+            to: Email address
+            otp: OTP code to send
+            purpose: Purpose of OTP (signup, login, recovery)
+            
+        Returns:
+            True if sent successfully
+        """
+        subject = OTP_EMAIL_SUBJECTS.get(purpose, "HABIBTI Verification Code")
+        template_values = {"otp": otp, "expiry": settings.OTP_EXPIRY_MINUTES}
+        html_body = OTP_EMAIL_HTML_TEMPLATE.format_map(template_values)
+        text_body = OTP_EMAIL_TEXT_TEMPLATE.format_map(template_values)
         
         if self.smtp_configured:
             try:
                 # Create message
-                message = MIMEMultipart("alternative")
+                message = EmailMessage()
                 message["Subject"] = subject
-                message["From"] = f"{self.from_name} <{self.from_email}>"
+                message["From"] = self.from_header
                 message["To"] = to
                 
-                # Attach both plain text and HTML versions
-                part1 = MIMEText(text_body, "plain")
-                part2 = MIMEText(html_body, "html")
-                message.attach(part1)
-                message.attach(part2)
+                # Plain text with an HTML alternative (multipart/alternative)
+                message.set_content(text_body)
+                message.add_alternative(html_body, subtype="html")
                 
                 # Send email
-                with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                    server.starttls()
-                    server.login(self.smtp_user, self.smtp_password)
-                    server.send_message(message)
+                await self._deliver(message)
                 
                 logger.info(f"OTP email sent to {to}")
                 return True
@@ -0,0 +1,58 @@
+"""
+Friend List Cache
+Cache-aside Redis cache of each user's accepted friend IDs
+"""
+
+from typing import List
+from app.core.redis import get_redis
+from app.models.friendship import FriendshipStatus
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+FRIEND_IDS_PREFIX = "friends:"
+FRIEND_IDS_TTL_SECONDS = 300
+
+
+async def get_friend_ids(user_id: str, db) -> List[str]:
+    """
+    Get a user's accepted friend IDs, reading through to MongoDB on a miss
+
+    Args:
+        user_id: User ID
+        db: Database instance
+
+    Returns:
+        Friend user IDs
+    """
+    redis = await get_redis()
+
+    # Stored as a JSON list so an empty friend list is cached too
+    cached = await redis.get(FRIEND_IDS_PREFIX + user_id)
+    if cached is not None:
+        return json.loads(cached)
+
+    friendships = await db.friendships.find(
+        {
+            "$or": [
+                {"requester_id": user_id, "status": FriendshipStatus.ACCEPTED},
+                {"addressee_id": user_id, "status": FriendshipStatus.ACCEPTED}
+            ]
+        },
+        {"_id": 0, "requester_id": 1, "addressee_id": 1}
+    ).to_list(length=None)
+
+    friend_ids = [
+        f["addressee_id"] if f["requester_id"] == user_id else f["requester_id"]
+        for f in friendships
+    ]
+
+    await redis.set(FRIEND_IDS_PREFIX + user_id, json.dumps(friend_ids), ex=FRIEND_IDS_TTL_SECONDS)
+    return friend_ids
+
+
+async def invalidate_friend_ids(*user_ids: str) -> None:
+    """Drop cached friend lists after a friendship changes"""
+    redis = await get_redis()
+    await redis.delete(*[FRIEND_IDS_PREFIX + uid for uid in user_ids])
@@ -0,0 +1,182 @@
+"""
+Message Status Buffer
+Write-behind queue for WebSocket delivered/read receipts, flushed with one bulk_write
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from app.core.database import get_database
+from app.core.websocket import manager
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATUS_BATCH_SIZE = 100
+STATUS_FLUSH_INTERVAL_SECONDS = 0.05
+
+# Receipt status -> (array under message.status, timestamp field of its entries)
+STATUS_FIELDS = {
+    "delivered": ("delivered_to", "delivered_at"),
+    "read": ("read_by", "read_at")
+}
+
+
+class StatusEvent(NamedTuple):
+    """A pending delivered/read receipt"""
+    message_id: str
+    user_id: str
+    status: str
+    timestamp: datetime
+
+
+class MessageStatusBuffer:
+    """Batches receipt writes and notifies senders after each flush"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        """Start the background flush task"""
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Message status buffer started")
+
+    async def stop(self):
+        """Flush whatever is queued and stop the background task"""
+        if not self._task:
+            return
+
+        self._stopping = True
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        logger.info("Message status buffer stopped")
+
+    async def add(self, message_id: str, user_id: str, status: str):
+        """
+        Queue a receipt; written and forwarded to the sender on the next flush
+
+        Args:
+            message_id: Message ID
+            user_id: User who received/read the message
+            status: "delivered" or "read"
+        """
+        if status not in STATUS_FIELDS:
+            return
+
+        # One parse (valid IDs are the common case) instead of is_valid() + ObjectId()
+        try:
+            message_oid = ObjectId(message_id)
+        except (InvalidId, TypeError):
+            return
+
+        event = StatusEvent(str(message_oid), user_id, status, datetime.utcnow())
+
+        if not self._task or self._stopping:
+            # Buffer not running: write this one directly
+            await self._write_one(event)
+            return
+
+        self._queue.put_nowait(event)
+
+    def _drain(self, batch: List[StatusEvent]) -> List[StatusEvent]:
+        """Pull queued receipts into the batch up to STATUS_BATCH_SIZE"""
+        while len(batch) < STATUS_BATCH_SIZE and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        return batch
+
+    async def _run(self):
+        """Wait for a receipt, collect more for a short window, then flush"""
+        while True:
+            item = await self._queue.get()
+            batch = [item] if item is not None else []
+            if batch and not self._stopping:
+                await asyncio.sleep(STATUS_FLUSH_INTERVAL_SECONDS)
+            try:
+                await self._flush(self._drain(batch))
+            except Exception as e:
+                logger.error(f"Message status flush failed: {e}")
+
+            if self._stopping and self._queue.empty():
+                return
+
+    def _status_update(self, event: StatusEvent) -> Tuple[dict, dict]:
+        """Filter and update recording one receipt (a receipt already recorded is left alone)"""
+        field, time_field = STATUS_FIELDS[event.status]
+        return (
+            {
+                "_id": ObjectId(event.message_id),
+                f"status.{field}.user_id": {"$ne": event.user_id}
+            },
+            {
+                "$push": {
+                    f"status.{field}": {
+                        "user_id": event.user_id,
+                        time_field: event.timestamp
+                    }
+                }
+            }
+        )
+
+    async def _write_one(self, event: StatusEvent):
+        """Record a single receipt and read its sender in the same round-trip"""
+        db = await get_database()
+        message = await db.messages.find_one_and_update(
+            *self._status_update(event),
+            projection={"sender_id": 1}
+        )
+        if message:
+            await self._notify([event], {event.message_id: message["sender_id"]})
+
+    async def _flush(self, batch: List[StatusEvent]):
+        """Write a batch of receipts, then notify each message's sender"""
+        if not batch:
+            return
+
+        db = await get_database()
+
+        await db.messages.bulk_write(
+            [UpdateOne(*self._status_update(event)) for event in batch],
+            ordered=False
+        )
+
+        # Senders of every message in the batch in one query
+        message_ids = list({ObjectId(event.message_id) for event in batch})
+        messages = await db.messages.find(
+            {"_id": {"$in": message_ids}},
+            {"sender_id": 1}
+        ).to_list(length=len(message_ids))
+
+        await self._notify(batch, {str(message["_id"]): message["sender_id"] for message in messages})
+
+    async def _notify(self, events: List[StatusEvent], senders: Dict[str, str]):
+        """Send message_status_update to the sender of each receipt's message"""
+        await asyncio.gather(*[
+            manager.send_to_user(
+                {
+                    "type": "message_status_update",
+                    "data": {
+                        "message_id": event.message_id,
+                        "status": event.status,
+                        "user_id": event.user_id,
+                        "timestamp": event.timestamp.isoformat()
+                    }
+                },
+                senders[event.message_id]
+            )
+            for event in events
+            if event.message_id in senders
+        ])
+
+
+# Global instance
+message_status_buffer = MessageStatusBuffer()
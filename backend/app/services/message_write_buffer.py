@@ -0,0 +1,113 @@
+"""
+Message Write Buffer
+Batches message inserts arriving within a few milliseconds into one insert_many
+"""
+
+from typing import List, Optional, Tuple
+from pymongo.errors import BulkWriteError
+from app.core.database import get_database
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Matches the WebSocket send batch size
+WRITE_BATCH_SIZE = 50
+FLUSH_INTERVAL_SECONDS = 0.005
+
+
+class MessageWriteBuffer:
+    """Queue of pending message inserts flushed by a background task"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        """Start the background flush task"""
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Message write buffer started")
+
+    async def stop(self):
+        """Flush whatever is queued and stop the background task"""
+        if not self._task:
+            return
+
+        # Wake the flush loop; it drains the queue before exiting
+        self._stopping = True
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        logger.info("Message write buffer stopped")
+
+    async def insert(self, message: dict):
+        """
+        Insert a message document, batched with concurrent sends
+
+        Args:
+            message: Message document (with a pre-generated _id)
+
+        Raises:
+            Any write error for this document
+        """
+        if not self._task or self._stopping:
+            # Buffer not running (scripts, tests): write directly
+            db = await get_database()
+            await db.messages.insert_one(message)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((message, future))
+        await future
+
+    def _drain(self, batch: List[Tuple[dict, asyncio.Future]]) -> List[Tuple[dict, asyncio.Future]]:
+        """Pull queued writes into the batch up to WRITE_BATCH_SIZE"""
+        while len(batch) < WRITE_BATCH_SIZE and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        return batch
+
+    async def _run(self):
+        """Wait for a write, give concurrent sends a moment to join, then flush"""
+        while True:
+            item = await self._queue.get()
+            batch = [item] if item is not None else []
+            if batch and not self._stopping:
+                await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            await self._flush(self._drain(batch))
+
+            if self._stopping and self._queue.empty():
+                return
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        """Write one batch and resolve each caller's future"""
+        if not batch:
+            return
+
+        errors = {}
+        try:
+            db = await get_database()
+            await db.messages.insert_many([message for message, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # Unordered: only the listed documents failed
+            for error in e.details.get("writeErrors", []):
+                errors[error["index"]] = BulkWriteError({"writeErrors": [error]})
+        except Exception as e:
+            logger.error(f"Message batch insert failed: {e}")
+            errors = {index: e for index in range(len(batch))}
+
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(None)
+
+
+# Global instance
+message_write_buffer = MessageWriteBuffer()
@@ -1,23 +1,33 @@
 """
 OTP Service
-Handles sending OTP via SMS using Twilio
+Handles sending OTP via SMS using Twilio's REST API
 """
 
-from twilio.rest import Client
 from app.core.config import settings
+import httpx
 import logging
 
 logger = logging.getLogger(__name__)
 
+TWILIO_API_BASE_URL = "https://api.twilio.com/2010-04-01/Accounts/{account_sid}/"
+TWILIO_TIMEOUT_SECONDS = 10.0
+
+SMS_BODY_TEMPLATE = (
+    "Your HABIBTI verification code is: {otp}\n\n"
+    f"This code expires in {settings.OTP_EXPIRY_MINUTES} minutes."
+)
+
 
 class OTPService:
     """OTP sending service"""
     
     def __init__(self):
         if settings.OTP_PROVIDER == "twilio" and settings.TWILIO_ACCOUNT_SID:
-            self.client = Client(
-                settings.TWILIO_ACCOUNT_SID,
-                settings.TWILIO_AUTH_TOKEN
+            # One keep-alive client reused for every SMS
+            self.client = httpx.AsyncClient(
+                base_url=TWILIO_API_BASE_URL.format(account_sid=settings.TWILIO_ACCOUNT_SID),
+                auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
+                timeout=TWILIO_TIMEOUT_SECONDS
             )
         else:
             self.client = None
@@ -34,16 +44,20 @@ class OTPService:
         Returns:
             True if sent successfully
         """
-        message_body = f"Your HABIBTI verification code is: {otp}\n\nThis code expires in {settings.OTP_EXPIRY_MINUTES} minutes."
+        message_body = SMS_BODY_TEMPLATE.format(otp=otp)
         
         if self.client:
             try:
-                message = self.client.messages.create(
-                    body=message_body,
-                    from_=settings.TWILIO_PHONE_NUMBER,
-                    to=to
+                response = await self.client.post(
+                    "Messages.json",
+                    data={
+                        "To": to,
+                        "From": settings.TWILIO_PHONE_NUMBER,
+                        "Body": message_body
+                    }
                 )
-                logger.info(f"OTP sent to {to}: {message.sid}")
+                response.raise_for_status()
+                logger.info(f"OTP sent to {to}: {response.json().get('sid')}")
                 return True
             except Exception as e:
                 logger.error(f"Failed to send OTP to {to}: {str(e)}")
@@ -55,6 +69,11 @@ class OTPService:
             print(f"OTP for {to}: {otp}")
             print(f"{'='*50}\n")
             return True
+    
+    async def close(self):
+        """Close the HTTP client"""
+        if self.client:
+            await self.client.aclose()
 
 
 # Global OTP service instance
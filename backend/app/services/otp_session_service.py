@@ -0,0 +1,158 @@
+"""
+OTP Session Service
+Stores OTP sessions in Redis and verifies them atomically with Lua scripts
+"""
+
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from app.core.redis import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Verification results returned by VERIFY_SCRIPT
+VERIFY_NOT_FOUND = -2
+VERIFY_MAX_ATTEMPTS = -1
+VERIFY_INVALID = 0
+VERIFY_OK = 1
+VERIFY_ALREADY_VERIFIED = 2
+
+# KEYS[1] = session key
+# ARGV[1] = otp hash, ARGV[2] = verified_at, ARGV[3] = TTL (seconds) once verified
+VERIFY_SCRIPT = """
+local s = redis.call('HMGET', KEYS[1], 'otp_hash', 'attempts', 'max_attempts', 'verified', 'session_token', 'identifier', 'purpose')
+if not s[1] then
+    return {-2}
+end
+if s[4] == '1' then
+    return {2, s[5] or '', s[6], s[7]}
+end
+local attempts = tonumber(s[2])
+local max_attempts = tonumber(s[3])
+if attempts >= max_attempts then
+    return {-1}
+end
+if s[1] == ARGV[1] then
+    redis.call('HSET', KEYS[1], 'verified', '1', 'verified_at', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+    return {1, '', s[6], s[7]}
+end
+redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+return {0, tostring(max_attempts - attempts - 1)}
+"""
+
+# KEYS[1] = identifier -> latest session id key
+# ARGV[1] = session key prefix
+INVALIDATE_SCRIPT = """
+local sid = redis.call('GET', KEYS[1])
+if not sid then
+    return 0
+end
+local key = ARGV[1] .. sid
+if redis.call('HGET', key, 'verified') == '0' then
+    redis.call('DEL', key)
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+
+class OTPSessionStore:
+    """Redis-backed OTP session store"""
+
+    SESSION_PREFIX = "otp:session:"
+    IDENTIFIER_PREFIX = "otp:identifier:"
+
+    def __init__(self):
+        self._scripts = {}
+
+    async def _run_script(self, source: str, keys: list, args: list):
+        """Run a Lua script via EVALSHA (falls back to EVAL if not cached on the server)"""
+        redis = await get_redis()
+        script = self._scripts.get(source)
+        if script is None or script.registered_client is not redis:
+            script = redis.register_script(source)
+            self._scripts[source] = script
+        return await script(keys=keys, args=args)
+
+    async def create(
+        self,
+        identifier: str,
+        otp_hash: str,
+        purpose: str,
+        ttl_seconds: int,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        max_attempts: int = 3
+    ) -> str:
+        """
+        Create a new OTP session
+
+        Returns:
+            Session ID
+        """
+        redis = await get_redis()
+        session_id = str(ObjectId())
+        key = self.SESSION_PREFIX + session_id
+
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "identifier": identifier,
+                "otp_hash": otp_hash,
+                "attempts": 0,
+                "max_attempts": max_attempts,
+                "created_at": datetime.utcnow().isoformat(),
+                "verified": 0,
+                "purpose": purpose,
+                "ip_address": ip_address or "",
+                "user_agent": user_agent or ""
+            })
+            pipe.expire(key, ttl_seconds)
+            pipe.setex(self.IDENTIFIER_PREFIX + identifier, ttl_seconds, session_id)
+            await pipe.execute()
+
+        return session_id
+
+    async def invalidate_pending(self, identifier: str) -> None:
+        """Expire the identifier's latest session if it has not been verified yet"""
+        await self._run_script(
+            INVALIDATE_SCRIPT,
+            keys=[self.IDENTIFIER_PREFIX + identifier],
+            args=[self.SESSION_PREFIX]
+        )
+
+    async def verify(
+        self,
+        session_id: str,
+        otp_hash: str,
+        verified_ttl_seconds: int
+    ) -> list:
+        """
+        Atomically check and consume an OTP attempt
+
+        Returns:
+            [VERIFY_OK, '', identifier, purpose],
+            [VERIFY_ALREADY_VERIFIED, stored session_token, identifier, purpose],
+            [VERIFY_INVALID, remaining_attempts] or [VERIFY_NOT_FOUND | VERIFY_MAX_ATTEMPTS]
+        """
+        return await self._run_script(
+            VERIFY_SCRIPT,
+            keys=[self.SESSION_PREFIX + session_id],
+            args=[otp_hash, datetime.utcnow().isoformat(), verified_ttl_seconds]
+        )
+
+    async def store_session_token(self, session_id: str, session_token: str) -> None:
+        """Attach the temp token issued for a verified session (returned on repeat verifies)"""
+        redis = await get_redis()
+        await redis.hset(self.SESSION_PREFIX + session_id, "session_token", session_token)
+
+    async def get_verified_identifier(self, session_id: str) -> Optional[str]:
+        """Return the session's identifier if it exists and has been verified"""
+        redis = await get_redis()
+        verified, identifier = await redis.hmget(self.SESSION_PREFIX + session_id, "verified", "identifier")
+        return identifier if verified == "1" else None
+
+
+# Global OTP session store instance
+otp_session_store = OTPSessionStore()
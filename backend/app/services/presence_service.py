@@ -0,0 +1,173 @@
+"""
+Presence Service
+Online state lives in Redis; last-seen is written behind to MongoDB in batches
+"""
+
+from typing import Iterable, Optional
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from app.core.database import get_database
+from app.core.redis import get_redis
+from app.core.websocket import manager
+from app.services.user_cache_service import ONLINE_USERS_KEY, ONLINE_REFRESH_INTERVAL_SECONDS
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# user_id -> latest {"online", "last_seen"} not yet persisted to MongoDB
+PENDING_PRESENCE_KEY = "users:presence_pending"
+PRESENCE_FLUSH_INTERVAL_SECONDS = 5
+
+# user_id -> open WebSocket connections across all workers. A crashed worker
+# leaves its counts behind; the user's presence entry still ages out.
+CONNECTION_COUNTS_KEY = "presence:connections"
+
+# KEYS[1] = connection counts, KEYS[2] = online hash, KEYS[3] = pending presence
+# ARGV[1] = user_id, ARGV[2] = +1 (connect) / -1 (disconnect), ARGV[3] = now (epoch seconds),
+# ARGV[4] = pending presence JSON
+# Online while any worker holds a connection; offline (and queued) only when the last one closes
+PRESENCE_SCRIPT = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if count > 0 then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+    if tonumber(ARGV[2]) > 0 then
+        redis.call('HSET', KEYS[3], ARGV[1], ARGV[4])
+    end
+    return count
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[4])
+return 0
+"""
+
+# Registered script (runs via EVALSHA), re-registered if the Redis client changes
+_presence_script = None
+
+
+async def record_presence(user_id: str, online: bool) -> int:
+    """
+    Count a user's connection opening/closing in Redis and queue presence changes for MongoDB
+
+    Args:
+        user_id: User ID
+        online: True when a connection opened, False when one closed
+
+    Returns:
+        The user's open connections across all workers (0 once they are offline)
+    """
+    global _presence_script
+    redis = await get_redis()
+    if _presence_script is None or _presence_script.registered_client is not redis:
+        _presence_script = redis.register_script(PRESENCE_SCRIPT)
+
+    # Repeated connects/disconnects before a flush collapse into one write
+    pending = json.dumps({"online": online, "last_seen": datetime.utcnow().isoformat()})
+    return await _presence_script(
+        keys=[CONNECTION_COUNTS_KEY, ONLINE_USERS_KEY, PENDING_PRESENCE_KEY],
+        args=[user_id, 1 if online else -1, int(time.time()), pending]
+    )
+
+
+async def refresh_presence(user_ids: Iterable[str]) -> None:
+    """
+    Keep connected users' presence entries from aging out
+
+    Args:
+        user_ids: IDs of users with an open connection
+    """
+    now = int(time.time())
+    mapping = {user_id: now for user_id in user_ids}
+    if not mapping:
+        return
+
+    redis = await get_redis()
+    await redis.hset(ONLINE_USERS_KEY, mapping=mapping)
+
+
+class PresenceFlusher:
+    """Background task persisting pending presence changes every few seconds"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background flush task"""
+        self._task = asyncio.create_task(self._run())
+        logger.info("Presence flusher started")
+
+    async def stop(self):
+        """Stop the background task and persist anything still pending"""
+        if not self._task:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        await self.flush()
+        logger.info("Presence flusher stopped")
+
+    async def _run(self):
+        """Flush on a fixed interval, refreshing this worker's connected users along the way"""
+        next_refresh = time.monotonic()
+        while True:
+            await asyncio.sleep(PRESENCE_FLUSH_INTERVAL_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Presence flush failed: {e}")
+
+            # Clients that never ping still stay online while their socket is open
+            if time.monotonic() >= next_refresh:
+                next_refresh = time.monotonic() + ONLINE_REFRESH_INTERVAL_SECONDS
+                try:
+                    await refresh_presence(manager.get_online_users())
+                except Exception as e:
+                    logger.error(f"Presence refresh failed: {e}")
+
+    async def flush(self):
+        """Move pending presence changes from Redis to MongoDB in one bulk_write"""
+        redis = await get_redis()
+
+        # Read and clear atomically so changes arriving meanwhile wait for the next flush
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(PENDING_PRESENCE_KEY)
+            pipe.delete(PENDING_PRESENCE_KEY)
+            pending, _ = await pipe.execute()
+
+        if not pending:
+            return
+
+        operations = []
+        for user_id, raw in pending.items():
+            try:
+                user_oid = ObjectId(user_id)
+            except InvalidId:
+                continue
+            presence = json.loads(raw)
+            operations.append(UpdateOne(
+                {"_id": user_oid},
+                {
+                    "$set": {
+                        "status.online": presence["online"],
+                        "status.last_seen": datetime.fromisoformat(presence["last_seen"])
+                    }
+                }
+            ))
+
+        if operations:
+            db = await get_database()
+            await db.users.bulk_write(operations, ordered=False)
+
+
+# Global instance
+presence_flusher = PresenceFlusher()
@@ -0,0 +1,126 @@
+"""
+User Card Cache
+Cache-aside Redis cache for the public user fields shown next to conversations
+"""
+
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from app.core.redis import get_redis
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+USER_CARD_PREFIX = "ucard:"
+USER_CARD_TTL_SECONDS = 60
+
+# Online presence is maintained by the WebSocket endpoint in one hash
+# (user ID -> last refresh in epoch seconds). Entries are refreshed on client
+# pings and by the presence flusher for every connected socket; one that has
+# missed a few refreshes counts as offline, which bounds stale presence left
+# by a crashed worker. (New key name: the earlier "users:online" was a set.)
+ONLINE_USERS_KEY = "presence:online"
+ONLINE_REFRESH_INTERVAL_SECONDS = 30
+ONLINE_TTL_SECONDS = 3 * ONLINE_REFRESH_INTERVAL_SECONDS
+
+USER_CARD_PROJECTION = {
+    "username": 1,
+    "profile.full_name": 1,
+    "profile.avatar_url": 1,
+    "status.last_seen": 1,
+    "encryption.public_key": 1
+}
+
+
+def is_online_entry(refreshed_at: Optional[str]) -> bool:
+    """Whether a presence:online hash value marks the user as currently online"""
+    return refreshed_at is not None and time.time() - int(refreshed_at) < ONLINE_TTL_SECONDS
+
+
+async def get_online_flags(user_ids: List[str]) -> List[bool]:
+    """
+    Check presence for many users in one round-trip
+
+    Args:
+        user_ids: User IDs to check
+
+    Returns:
+        Online flag per user ID, in the same order
+    """
+    if not user_ids:
+        return []
+
+    redis = await get_redis()
+    return [is_online_entry(value) for value in await redis.hmget(ONLINE_USERS_KEY, user_ids)]
+
+
+def build_user_card(user: dict) -> dict:
+    """Build the cached card from a users document"""
+    last_seen = user.get("status", {}).get("last_seen")
+    return {
+        "user_id": str(user["_id"]),
+        "username": user["username"],
+        "full_name": user["profile"]["full_name"],
+        "avatar_url": user["profile"].get("avatar_url"),
+        "last_seen": last_seen.isoformat() if last_seen else None,
+        "public_key": user.get("encryption", {}).get("public_key")
+    }
+
+
+async def get_user_cards(user_ids: Iterable[str], db) -> Dict[str, dict]:
+    """
+    Get user cards, reading through to MongoDB for cache misses
+
+    Args:
+        user_ids: User IDs to fetch
+        db: Database instance
+
+    Returns:
+        Mapping of user ID -> card (with live "online" flag)
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+
+    redis = await get_redis()
+
+    # Cards and presence in one round-trip
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.mget([USER_CARD_PREFIX + uid for uid in user_ids])
+        pipe.hmget(ONLINE_USERS_KEY, user_ids)
+        cached, connected_at = await pipe.execute()
+    online = [is_online_entry(value) for value in connected_at]
+
+    cards = {}
+    misses = []
+    for uid, raw in zip(user_ids, cached):
+        if raw:
+            cards[uid] = json.loads(raw)
+        else:
+            misses.append(uid)
+
+    if misses:
+        users = await db.users.find(
+            {"_id": {"$in": [ObjectId(uid) for uid in misses]}},
+            USER_CARD_PROJECTION
+        ).to_list(length=len(misses))
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for user in users:
+                card = build_user_card(user)
+                cards[card["user_id"]] = card
+                pipe.set(USER_CARD_PREFIX + card["user_id"], json.dumps(card), ex=USER_CARD_TTL_SECONDS)
+            await pipe.execute()
+
+    for uid, is_online in zip(user_ids, online):
+        if uid in cards:
+            cards[uid]["online"] = bool(is_online)
+
+    return cards
+
+
+async def invalidate_user_card(user_id: str) -> None:
+    """Drop a user's cached card after a profile change"""
+    redis = await get_redis()
+    await redis.delete(USER_CARD_PREFIX + user_id)
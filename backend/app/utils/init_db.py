@@ -5,63 +5,150 @@ Creates indexes and initial setup
 
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
 from app.core.config import settings
+from app.core.database import (
+    USERNAME_SEARCH_COLLATION,
+    backfill_conversation_pair_keys,
+    backfill_friendship_pair_keys,
+    migrate_mobile_index,
+    migrate_moments_expiry_index
+)
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Conversation updates sent per bulk_write while backfilling unread counts
+UNREAD_BACKFILL_BATCH_SIZE = 500
+
+
+async def backfill_unread_counts(db):
+    """
+    Set each participant's denormalized unread_count from their messages
+    
+    Conversations created before the counter existed report 0 (then 1 after the
+    next message) until this runs. The count is the query the counter replaced:
+    messages from others created after the participant's last_read_at. Re-running
+    recomputes the counts, so run it while sends are quiet.
+    """
+    operations = []
+    async for conversation in db.conversations.find({}, {"participants": 1}):
+        conversation_id = str(conversation["_id"])
+        for participant in conversation.get("participants", []):
+            query = {"conversation_id": conversation_id, "sender_id": {"$ne": participant["user_id"]}}
+            if participant.get("last_read_at"):
+                query["created_at"] = {"$gt": participant["last_read_at"]}
+            
+            operations.append(UpdateOne(
+                {"_id": conversation["_id"]},
+                {"$set": {"participants.$[participant].unread_count": await db.messages.count_documents(query)}},
+                array_filters=[{"participant.user_id": participant["user_id"]}]
+            ))
+        
+        if len(operations) >= UNREAD_BACKFILL_BATCH_SIZE:
+            await db.conversations.bulk_write(operations, ordered=False)
+            operations = []
+    
+    if operations:
+        await db.conversations.bulk_write(operations, ordered=False)
+
 
 async def create_indexes():
-    """Create database indexes"""
+    """Create database indexes (one createIndexes command per collection, collections in parallel)"""
     logger.info("Connecting to MongoDB...")
     client = AsyncIOMotorClient(settings.MONGODB_URI)
     db = client[settings.MONGODB_DB_NAME]
     
-    logger.info("Creating indexes...")
-    
-    # Users collection indexes
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("username", unique=True)
-    await db.users.create_index("profile.mobile", unique=True)  # Mobile must be unique
-    logger.info("✓ Users indexes created")
+    logger.info("Backfilling pair keys...")
     
-    # OTP sessions collection indexes
-    await db.otp_sessions.create_index("identifier")
-    await db.otp_sessions.create_index("expires_at", expireAfterSeconds=0)  # TTL index
-    logger.info("✓ OTP sessions indexes created")
+    # Backfill pair_key ("<lower id>:<higher id>") on documents created before it existed,
+    # before the unique pair_key indexes are built
+    await asyncio.gather(
+        backfill_conversation_pair_keys(db),
+        backfill_friendship_pair_keys(db)
+    )
     
-    # Conversations collection indexes
-    await db.conversations.create_index("participant_ids")
-    await db.conversations.create_index([("participants.user_id", 1)])
-    await db.conversations.create_index([("metadata.updated_at", -1)])
-    await db.conversations.create_index([("type", 1), ("participant_ids", 1)], unique=True)  # Unique one-to-one conversations
-    logger.info("✓ Conversations indexes created")
+    logger.info("Backfilling unread counts...")
+    await backfill_unread_counts(db)
     
-    # Messages collection indexes
-    await db.messages.create_index([("conversation_id", 1), ("created_at", -1)])
-    await db.messages.create_index([("sender_id", 1), ("created_at", -1)])
-    await db.messages.create_index("expires_at", sparse=True)  # For ephemeral messages
-    await db.messages.create_index([("status.sent_at", 1)])
-    logger.info("✓ Messages indexes created")
+    # Drop indexes built with older options so the new definitions can be created
+    await asyncio.gather(
+        migrate_mobile_index(db.users),
+        migrate_moments_expiry_index(db.moments)
+    )
     
-    # Friendships collection indexes
-    await db.friendships.create_index([("requester_id", 1), ("addressee_id", 1)], unique=True)
-    await db.friendships.create_index([("requester_id", 1), ("status", 1)])
-    await db.friendships.create_index([("addressee_id", 1), ("status", 1)])
-    await db.friendships.create_index([("status", 1)])
-    logger.info("✓ Friendships indexes created")
+    logger.info("Creating indexes...")
     
-    # Moments collection indexes
-    await db.moments.create_index([("user_id", 1), ("created_at", -1)])
-    await db.moments.create_index([("expires_at", 1)])  # For auto-cleanup
-    await db.moments.create_index([("deleted", 1), ("expires_at", 1)])
-    await db.moments.create_index("expires_at", expireAfterSeconds=0)  # TTL index for auto-deletion
-    logger.info("✓ Moments indexes created")
+    indexes = {
+        "users": [
+            IndexModel("email", unique=True),
+            IndexModel("username", unique=True),
+            IndexModel("username", name="username_ci", collation=USERNAME_SEARCH_COLLATION),  # Prefix search
+            IndexModel("profile.mobile", unique=True, sparse=True)  # Mobile must be unique (same definition as startup)
+        ],
+        "conversations": [
+            IndexModel([("participant_ids", ASCENDING), ("metadata.updated_at", DESCENDING)]),  # Conversation list
+            IndexModel([("participants.user_id", ASCENDING)]),
+            IndexModel(
+                "pair_key",
+                unique=True,
+                partialFilterExpression={"pair_key": {"$type": "string"}}
+            )  # One conversation per pair of users, target of the one-to-one upsert
+        ],
+        "messages": [
+            IndexModel([("conversation_id", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel([("conversation_id", ASCENDING), ("_id", DESCENDING)]),  # Newest-first paging by _id
+            IndexModel([("sender_id", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel(
+                "metadata.expires_at",
+                expireAfterSeconds=0,
+                partialFilterExpression={"metadata.is_ephemeral": True}
+            ),  # TTL index deleting ephemeral messages
+            IndexModel([("status.sent_at", ASCENDING)])
+        ],
+        "friendships": [
+            IndexModel(
+                "pair_key",
+                unique=True,
+                partialFilterExpression={"pair_key": {"$type": "string"}}
+            ),  # One friendship per pair of users, target of the upserts
+            IndexModel([("requester_id", ASCENDING), ("addressee_id", ASCENDING)], unique=True),
+            IndexModel([("requester_id", ASCENDING), ("status", ASCENDING), ("responded_at", DESCENDING)]),  # Friends list ($or branch)
+            IndexModel([("addressee_id", ASCENDING), ("status", ASCENDING), ("responded_at", DESCENDING)]),  # Friends list ($or branch)
+            IndexModel([("requester_id", ASCENDING), ("requested_at", DESCENDING)]),  # Sent requests
+            IndexModel([("addressee_id", ASCENDING), ("requested_at", DESCENDING)]),  # Received requests
+            IndexModel([("status", ASCENDING)])
+        ],
+        "moments": [
+            IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel([("deleted", ASCENDING), ("expires_at", ASCENDING)]),
+            IndexModel("expires_at", expireAfterSeconds=0)  # TTL index for auto-deletion (also serves expires_at queries)
+        ]
+    }
     
-    logger.info("All indexes created successfully!")
+    # A failing collection is reported without aborting the others
+    results = await asyncio.gather(
+        *[
+            db[collection].create_indexes(models)
+            for collection, models in indexes.items()
+        ],
+        return_exceptions=True
+    )
+    failed = []
+    for collection, result in zip(indexes, results):
+        if isinstance(result, Exception):
+            logger.error(f"✗ {collection} indexes failed: {result}")
+            failed.append(collection)
+        else:
+            logger.info(f"✓ {collection} indexes created")
     
     client.close()
+    
+    if failed:
+        raise RuntimeError(f"Index creation failed for: {', '.join(failed)}")
+    
+    logger.info("All indexes created successfully!")
 
 
 async def main():
@@ -1,19 +1,42 @@
 """
 Media upload utilities using Cloudinary
 """
-import cloudinary
-import cloudinary.uploader
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from fastapi import UploadFile, HTTPException, status
 from app.core import settings
-import io
+import asyncio
+import os
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Cloudinary chunked upload part size (its minimum is 5MB)
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+
+# Uploads hold a thread for the whole transfer; a dedicated, bounded pool keeps them
+# from exhausting the shared threadpool that sync dependencies/endpoints run on
+UPLOAD_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cloudinary")
+
+
+@lru_cache(maxsize=None)
+def get_cloudinary_uploader():
+    """Import and configure the Cloudinary SDK on first upload (keeps it out of startup)"""
+    import cloudinary
+    import cloudinary.uploader
+    
+    cloudinary.config(
+        cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+        api_key=settings.CLOUDINARY_API_KEY,
+        api_secret=settings.CLOUDINARY_API_SECRET,
+        secure=True
+    )
+    return cloudinary.uploader
+
+
+def upload_large(file, **options) -> dict:
+    """Chunked Cloudinary upload (blocking; runs on UPLOAD_POOL)"""
+    return get_cloudinary_uploader().upload_large(file, **options)
 
-# Initialize Cloudinary
-cloudinary.config( 
-  cloud_name = settings.CLOUDINARY_CLOUD_NAME, 
-  api_key = settings.CLOUDINARY_API_KEY, 
-  api_secret = settings.CLOUDINARY_API_SECRET,
-  secure = True
-)
 
 async def upload_image(file: UploadFile, folder: str = "habibti/avatars", resource_type: str = "image") -> dict:
     """
@@ -34,31 +57,30 @@ async def upload_image(file: UploadFile, folder: str = "habibti/avatars", resour
             detail="File must be an image"
         )
     
-    # Read file content
-    content = await file.read()
+    # Check file size (limit to 10MB) without reading the spooled body into memory
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
     
-    # Check file size (limit to 10MB)
-    if len(content) > 10 * 1024 * 1024:
+    if size > MAX_UPLOAD_SIZE:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File size exceeds 10MB limit"
         )
         
     try:
-        # Upload to Cloudinary
-        import asyncio
-        from functools import partial
-        
-        loop = asyncio.get_event_loop()
-        upload_func = partial(
-            cloudinary.uploader.upload,
-            io.BytesIO(content),
-            folder=folder,
-            resource_type=resource_type
+        # Stream to Cloudinary from the spooled file in chunks (SDK is sync, so off the event loop)
+        response = await asyncio.get_running_loop().run_in_executor(
+            UPLOAD_POOL,
+            partial(
+                upload_large,
+                file.file,
+                folder=folder,
+                resource_type=resource_type,
+                chunk_size=UPLOAD_CHUNK_SIZE
+            )
         )
         
-        response = await loop.run_in_executor(None, upload_func)
-        
         return {
             "url": response.get("secure_url"),
             "public_id": response.get("public_id"),
@@ -0,0 +1,27 @@
+"""
+Response helpers
+"""
+from fastapi import Response, status
+from pydantic import TypeAdapter
+
+
+def json_response(adapter: TypeAdapter, value, status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    Serialize an already-built response with its cached TypeAdapter
+    
+    Returning a Response skips FastAPI's re-validation against response_model
+    (which stays on the route for the OpenAPI schema).
+    
+    Args:
+        adapter: Module-level TypeAdapter for the response model
+        value: Response model instance
+        status_code: HTTP status code
+        
+    Returns:
+        JSON response
+    """
+    return Response(
+        content=adapter.dump_json(value),
+        status_code=status_code,
+        media_type="application/json"
+    )